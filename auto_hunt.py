@@ -1,21 +1,168 @@
 from openpyxl import load_workbook, Workbook
+import argparse
 import datetime as dt
+import json
+import sqlite3
+import sys
+import time
 from shutil import copyfile
 from csv import reader as csvreader
 from csv import writer as csvwriter
-from os.path import join as pathjoin
+from os import makedirs, replace, stat
+from os.path import dirname, join as pathjoin, splitext
 
-from backend import search_part, convert_to_dict
+from backend import (
+    chunks, configure, create_connection, get_parts, missing_tables
+)
 
 
-def get_type_parts(part_type):
+PARTS_DIR = "parts_in_sp"
+
+# Checked in this order, so a part listed in more than one file is
+# classified by the first.
+PART_TYPES = ("HDD", "MEM", "CPU")
+
+TYPE_INDEX_FILE = "type_index.json"
+
+ARCHIVE_DIR = "openPO Reports"
+
+# Repair locations and brands whose orders are hunted.
+REPAIR_LOCS = ("1320", "622", "630", "68", "67", "69", "610", "615", "618", "624")
+BRANDS = ("ACE", "ALI", "ASU", "DEL", "GWY", "HEW", "LNV",
+          "MSS", "RCM", "RZR", "SAC", "SYC", "TSC",)
+
+# Progress is checked every PROGRESS_EVERY rows and reported at most
+# once every PROGRESS_INTERVAL seconds.
+PROGRESS_EVERY = 1000
+PROGRESS_INTERVAL = 0.5
+
+# Parts whose flags purge_subbed looks up per query, and so per
+# progress update.
+PURGE_BATCH_SIZE = 5000
+
+_type_indexes = {}
+
+
+class HuntProgress:
+    """
+    A progress event from one stage of run_hunt.
+
+    :param stage: Name of the stage
+    :param rows: Rows processed so far
+    :param fraction: How much of the stage is done from 0 to 1, None
+        if unknown
+    :param rate: Rows per second
+    :param eta: Estimated seconds left in the stage, None if unknown
+    """
+
+    __slots__ = ("stage", "rows", "fraction", "rate", "eta")
+
+    def __init__(self, stage, rows, fraction, rate, eta):
+        self.stage = stage
+        self.rows = rows
+        self.fraction = fraction
+        self.rate = rate
+        self.eta = eta
+
+    def __repr__(self):
+        return "HuntProgress({!r}, {!r}, {!r}, {!r}, {!r})".format(
+            self.stage, self.rows, self.fraction, self.rate, self.eta
+        )
+
+    def __str__(self):
+        text = "{}: {} rows, {:.0f} rows/s".format(self.stage, self.rows, self.rate)
+        if self.fraction is not None:
+            text += ", {:.0%}".format(self.fraction)
+        if self.eta is not None:
+            text += ", {:.0f}s left".format(self.eta)
+        return text
+
+
+class ProgressReporter:
+    """
+    Builds HuntProgress events for one stage and passes them to
+    progress, at most once every PROGRESS_INTERVAL seconds.
+
+    :param stage: Name of the stage
+    :param progress: Callable taking a HuntProgress, or None
+    :param total: Size of the stage, in rows unless update is given
+        another measure of how far through it is
+    """
+
+    def __init__(self, stage, progress, total=None):
+        self.stage = stage
+        self.progress = progress
+        self.total = total
+        self.start = self.last = time.perf_counter()
+
+    def update(self, rows, done=None, final=False):
+        """
+        Reports rows processed so far.
+
+        :param rows: Rows processed so far
+        :param done: How far through the stage it is in the units of
+            total, defaults to rows
+        :param final: Report even if the last report was very recent
+        """
+        if self.progress is None:
+            return
+        now = time.perf_counter()
+        if not final and now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        elapsed = now - self.start
+        fraction = None
+        if final:
+            fraction = 1.0
+        elif self.total:
+            fraction = min((rows if done is None else done) / self.total, 1.0)
+        eta = None
+        if fraction:
+            eta = elapsed * (1 - fraction) / fraction
+        self.progress(
+            HuntProgress(
+                self.stage, rows, fraction, rows / elapsed if elapsed else 0.0, eta
+            )
+        )
+
+
+def track(rows, stage, progress, total=None, position=None):
+    """
+    Yields rows, reporting progress through the stage as they go by.
+    Each row only costs a counter; the clock is checked every
+    PROGRESS_EVERY rows.
+
+    :param rows: Iterable of rows
+    :param stage: Name of the stage
+    :param progress: Callable taking a HuntProgress, or None
+    :param total: Size of the stage, in rows unless position is given
+    :param position: Callable returning how far through the stage it
+        is in the units of total
+    """
+    if progress is None:
+        yield from rows
+        return
+    reporter = ProgressReporter(stage, progress, total)
+    count = 0
+    next_check = PROGRESS_EVERY
+    for row in rows:
+        yield row
+        count += 1
+        if count == next_check:
+            next_check += PROGRESS_EVERY
+            reporter.update(count, position() if position is not None else None)
+    reporter.update(count, final=True)
+
+
+def get_type_parts(part_type, parts_dir=PARTS_DIR):
     """
     Returns a list of part numbers based on part_type.
 
     :param part_type: String indicating 'HDD', 'MEM', or 'CPU'
+    :param parts_dir: Directory holding the all<TYPE>.csv files
     :return: List of part numbers from csv file
     """
-    file = pathjoin("parts_in_sp", "all" + part_type + ".csv")
+    file = pathjoin(parts_dir, "all" + part_type + ".csv")
     data = []
     with open(file, "r") as csvfile:
         reader = csvreader(csvfile)
@@ -23,16 +170,69 @@ def get_type_parts(part_type):
             data.append(row[0])
     return data
 
-def get_all_parts():
+
+def parts_fingerprint(parts_dir=PARTS_DIR):
+    """
+    Returns the size and modification time of each all<TYPE>.csv file
+    so a stale type index can be detected without reading them.
+
+    :param parts_dir: Directory holding the all<TYPE>.csv files
+    :return: List of [part type, size, mtime in ns]
+    """
+    fingerprint = []
+    for part_type in PART_TYPES:
+        info = stat(pathjoin(parts_dir, "all" + part_type + ".csv"))
+        fingerprint.append([part_type, info.st_size, info.st_mtime_ns])
+    return fingerprint
+
+
+def get_all_parts(parts_dir=PARTS_DIR):
     """
-    Returns a dictionary with part types as keys and a part numbers as values.
+    Returns a dictionary mapping every known part number to its type.
+
+    The index is kept in memory for later hunts and saved next to the
+    csv files, and is only rebuilt when one of them changes.
+
+    :param parts_dir: Directory holding the all<TYPE>.csv files
+    :return: Dict of part number -> 'HDD', 'MEM', or 'CPU'
     """
+    fingerprint = parts_fingerprint(parts_dir)
+    cached = _type_indexes.get(parts_dir)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    index_file = pathjoin(parts_dir, TYPE_INDEX_FILE)
+    try:
+        with open(index_file, "r") as jsonfile:
+            saved = json.load(jsonfile)
+        if saved["fingerprint"] == fingerprint:
+            _type_indexes[parts_dir] = (fingerprint, saved["index"])
+            return saved["index"]
+    except (OSError, ValueError, KeyError):
+        pass
+
     all_parts = {}
-    for part_type in ["HDD", "MEM", "CPU"]:
-        all_parts[part_type] = get_type_parts(part_type)
-        
+    for part_type in PART_TYPES:
+        for part_num in get_type_parts(part_type, parts_dir):
+            all_parts.setdefault(part_num, part_type)
+
+    try:
+        with open(index_file + ".tmp", "w") as jsonfile:
+            json.dump({"fingerprint": fingerprint, "index": all_parts}, jsonfile)
+        replace(index_file + ".tmp", index_file)
+    except OSError as e:
+        print(repr(e))
+
+    _type_indexes[parts_dir] = (fingerprint, all_parts)
     return all_parts
 
+def archive_path():
+    """
+    Returns the path of today's local copy of the openPO report.
+    """
+    return pathjoin(ARCHIVE_DIR, "openPO " + str(dt.date.today()) + ".xlsx")
+
+
 def copy_file(original):
     """
     Copies the openPO report to the local HDD and returns the path of the copy.
@@ -40,106 +240,343 @@ def copy_file(original):
     :param original: Path of the file to be copied
     :return: Path for the new local copy
     """
-    local_copy = pathjoin(r"openPO Reports", "openPO " + str(dt.date.today()) + ".xlsx")
+    local_copy = archive_path()
 
     copyfile(original, local_copy)
     return local_copy
 
+
+def _copy_lines(lines, copy):
+    """Yields each of lines after writing it to the file object copy."""
+    for line in lines:
+        copy.write(line)
+        yield line
+
+
+def read_report(file, archive=None, progress=None):
+    """
+    Lazily yields the rows of the tab-delimited openPO report.  If
+    archive is given, the report is copied there in the same pass.
+
+    :param file: Path of the openPO report
+    :param archive: Path to write a copy of the report to, or None
+    :param progress: Callable taking a HuntProgress, or None
+    :return: Generator of rows as lists of strings
+    """
+    with open(file, "r", newline="") as report:
+        total = stat(file).st_size
+        if archive is None:
+            yield from track(
+                csvreader(report, delimiter="\t"),
+                "Read report",
+                progress,
+                total,
+                report.buffer.tell,
+            )
+            return
+        makedirs(dirname(archive) or ".", exist_ok=True)
+        with open(archive, "w", newline="") as copy:
+            yield from track(
+                csvreader(_copy_lines(report, copy), delimiter="\t"),
+                "Read report",
+                progress,
+                total,
+                report.buffer.tell,
+            )
+
+
+def validate(row, all_parts):
+    """
+    Checks if a report row is an order that should be hunted.
+
+    :param row: Row from the openPO report
+    :param all_parts: Dict returned by get_all_parts
+    :return: True or False
+    """
+    if len(row) < 32:
+        return False
+    if row[0] not in REPAIR_LOCS:
+        return False
+    if get_type(row[31], all_parts) is None:
+        return False
+    if row[21] not in BRANDS:
+        return False
+    if row[15] != row[14]:
+        return False
+
+    return True
+
+
+def filter_data(rows, all_parts):
+    """
+    Yields [part number, type, warranty, SO] for each row that passes
+    validate.
+
+    :param rows: Iterable of openPO report rows
+    :param all_parts: Dict returned by get_all_parts
+    """
+    for row in rows:
+        if validate(row, all_parts):
+            yield [row[31], get_type(row[31], all_parts), row[14], row[13]]
+
+
+def dedupe(rows):
+    """
+    Yields rows, skipping any that have already been seen.
+
+    :param rows: Iterable of lists
+    """
+    seen = set()
+    for row in rows:
+        key = tuple(row)
+        if key not in seen:
+            seen.add(key)
+            yield row
+
+
+def get_orders(file, all_parts, archive=None, progress=None):
+    """
+    Streams the openPO report through validate, filter_data and
+    dedupe, skipping its header row.  Only the filtered orders are
+    ever held in memory.
+
+    :param file: Path of the openPO report
+    :param all_parts: Dict returned by get_all_parts
+    :param archive: Path to write a copy of the report to, or None
+    :param progress: Callable taking a HuntProgress, or None
+    :return: Generator of [part number, type, warranty, SO]
+    """
+    rows = read_report(file, archive, progress)
+    next(rows, None)
+    return dedupe(filter_data(rows, all_parts))
+
 def get_type(part_num, all_parts):
     """
-    Checks if part_num is in all_hdds, all_mem, or all_cpus and
-    returns a sring indicating which is true.
+    Looks part_num up in the index built by get_all_parts and
+    returns a sring indicating its type.
 
     :param part_num: Part number
-    :return: "HDD", "MEM", or "CPU"
+    :param all_parts: Dict returned by get_all_parts
+    :return: "HDD", "MEM", "CPU" or None
     """
+    return all_parts.get(part_num)
 
-    if part_num in all_parts["HDD"]:
-        return "HDD"
-    elif part_num in all_parts["MEM"]:
-        return "MEM"
-    elif part_num in all_parts["CPU"]:
-        return "CPU"
-    else:
-        return None
-
-def purge_subbed(part_nums):
+def purge_subbed(part_nums, progress=None):
     """
-    Loops through part_nums and checks if the part number is
-    in the database and if not, adds it to clean_list. Also
-    calls convert_to_dict to check if part number has a sub.
-    If not, the part is added to the clean_list.
+    Removes parts that do not need a sub from part_nums.  A part is
+    kept if it is not in the database, or if it is but has no sub
+    relation set up and is not marked do not sub.
+
+    The do_not_sub and subbed flags are fetched with chunked queries
+    per table rather than per part.
 
-    :param part_nums: List of part numbers to be checked
+    :param part_nums: List of [part number, type, ...] rows to be checked
+    :param progress: Callable taking a HuntProgress, or None
     :return: List of parts that are not in the databse or have no
-        sub relation setup
+        sub relation setup, in the order given
     """
+    tables = {}
+    for part_num in part_nums:
+        tables.setdefault(part_num[1].lower(), set()).add(part_num[0])
+
+    reporter = ProgressReporter(
+        "Purge subbed", progress, sum(len(nums) for nums in tables.values())
+    )
+    checked = 0
+    flags = {}
+    for table, nums in tables.items():
+        flags[table] = {}
+        for chunk in chunks(list(nums), PURGE_BATCH_SIZE):
+            flags[table].update(get_parts(table, chunk, ("do_not_sub", "subbed")))
+            checked += len(chunk)
+            reporter.update(checked)
+    reporter.update(checked, final=True)
+
     clean_list = []
+    missing_seen = set()
     for part_num in part_nums:
-        if (search_part(part_num[1].lower(), part_num[0]) is None and
-                part_num not in clean_list):
-            clean_list.append(part_num)
-        elif (search_part(part_num[1].lower(), part_num[0]) is not None):
-            part_dict = convert_to_dict(part_num[1].lower(), part_num[0])
-            if (part_dict["subbed"] == "FALSE" and part_dict["do_not_sub"] == "FALSE"):
+        part = flags[part_num[1].lower()].get(part_num[0])
+        if part is None:
+            if tuple(part_num) not in missing_seen:
+                missing_seen.add(tuple(part_num))
                 clean_list.append(part_num)
+        elif part["subbed"] == "FALSE" and part["do_not_sub"] == "FALSE":
+            clean_list.append(part_num)
 
     return clean_list
 
-def save_to_file(part_nums):
+def hunt_path():
+    """
+    Returns the default path of today's hunt results.
+    """
+    return pathjoin(r"hunts", str(dt.date.today()) + " hunt.xlsx")
+
+
+def write_sheets(part_nums, needs_sub, non_warr):
+    """
+    Builds the rows of the 'Needs Sub' and 'Non-Warr Orders' sheets in
+    a single pass over part_nums, handing each row to the matching
+    callable as soon as it is ready.  'Needs Sub' lists each part once;
+    'Non-Warr Orders' lists every order not under MFG warranty and only
+    gets headings if there is at least one.
+
+    :param part_nums: Iterable of [part number, type, warranty, SO]
+    :param needs_sub: Callable taking a row for 'Needs Sub'
+    :param non_warr: Callable taking a row for 'Non-Warr Orders'
+    """
+    parts_seen = set()
+    non_warr_started = False
+    needs_sub(["Part Num", "Type"])
+    for row in part_nums:
+        if row[2] != "MFG Warranty":
+            if not non_warr_started:
+                non_warr(["Part Num", "Type", "Warr", "SO"])
+                non_warr_started = True
+            non_warr(list(row))
+        if row[0] not in parts_seen:
+            parts_seen.add(row[0])
+            needs_sub(list(row[:2]))
+
+
+def non_warr_path(path):
+    """
+    Returns the path the 'Non-Warr Orders' sheet is saved to when
+    saving results as CSV.
+
+    :param path: Path of the 'Needs Sub' CSV file
+    """
+    return splitext(path)[0] + " Non-Warr Orders.csv"
+
+
+def save_to_file(part_nums, path=None):
     """
-    Creates a workbook object and builds the 'Needs Sub' and
-    'Non-Warr Orders' sheets then saves the workbook as an
-    Excel file.
+    Saves the 'Needs Sub' and 'Non-Warr Orders' sheets.  Rows are
+    streamed to write-only worksheets so memory use does not grow with
+    the size of the hunt.
 
-    :param part_nums: List of part numbers to be saved
+    If path ends in .csv the sheets are saved as two plain CSV files
+    instead: path and the path returned by non_warr_path.
+
+    :param part_nums: Iterable of part numbers to be saved
+    :param path: Where to save the workbook, defaults to hunt_path()
     :return: 'Done'
     """
+    if path is None:
+        path = hunt_path()
 
-    def build_sheets():
-        """
-        Populates the sheets with values based on the data provided
-        in the part_nums list.
-        """
-        parts_seen = []
-        add_to_sheet2 = []
-        # Populating cell data for 'Needs Sub' sheet
-        headings = ["Part Num", "Type"]
-        for heading in enumerate(headings):
-            worksheet1.cell(row=1, column=heading[0] + 1,
-                            value=heading[1])
-        row_num = 2
-        for row in part_nums:
-            if row[2] != "MFG Warranty":
-                add_to_sheet2.append(row)
-            if row[0] not in parts_seen:
-                for part_data in enumerate(row[:2]):
-                    worksheet1.cell(row=row_num, column=part_data[0] + 1,
-                                    value=part_data[1])
-                parts_seen.append(row[0])
-                row_num += 1
-            else:
-                continue
-        # Populating cell data for 'Non-Warr Orders' sheet
-        if len(add_to_sheet2):
-            headings = ["Part Num", "Type", "Warr", "SO"]
-            for heading in enumerate(headings):
-                worksheet2.cell(row=1, column=heading[0] + 1,
-                                value=heading[1])
-            for row in enumerate(add_to_sheet2):
-                for element in enumerate(row[1]):
-                    worksheet2.cell(row=row[0] + 2, column=element[0] + 1,
-                                    value=element[1])
-
-    path = pathjoin(
-        r"hunts",
-        str(dt.date.today()) + " hunt.xlsx"
-        )
-    workbook = Workbook()
-    worksheet1 = workbook.active
-    worksheet1.title = "Needs Sub"
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="") as needs_sub, open(
+            non_warr_path(path), "w", newline=""
+        ) as non_warr:
+            write_sheets(
+                part_nums, csvwriter(needs_sub).writerow, csvwriter(non_warr).writerow
+            )
+        return "Done"
+
+    workbook = Workbook(write_only=True)
+    worksheet1 = workbook.create_sheet("Needs Sub")
     worksheet2 = workbook.create_sheet("Non-Warr Orders")
-    build_sheets()
+    write_sheets(part_nums, worksheet1.append, worksheet2.append)
 
     workbook.save(path)
     return "Done"
+
+
+def run_hunt(
+    report, output=None, parts_dir=PARTS_DIR, archive=None, log=None, progress=None
+):
+    """
+    Runs a complete Auto Hunt: classifies the orders in report, drops
+    parts that already have subs and saves the rest.
+
+    :param report: Path of the openPO report
+    :param output: Where to save the results, defaults to hunt_path()
+    :param parts_dir: Directory holding the all<TYPE>.csv files
+    :param archive: Path to copy the report to while reading, or None
+    :param log: Callable taking a message, called with each stage's timing
+    :param progress: Callable taking a HuntProgress, called as each
+        stage runs
+    :return: List of orders that need a sub
+    """
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        if log is not None:
+            log("{}: {:.2f}s".format(stage, time.perf_counter() - start))
+        return result
+
+    reporter = ProgressReporter("Load part types", progress)
+    all_parts = timed("Load part types", get_all_parts, parts_dir)
+    reporter.update(len(all_parts), final=True)
+    orders = timed(
+        "Read and filter report",
+        lambda: list(get_orders(report, all_parts, archive, progress)),
+    )
+    needs_sub = timed("Purge subbed", purge_subbed, orders, progress)
+    timed(
+        "Save results",
+        save_to_file,
+        track(needs_sub, "Save results", progress, len(needs_sub)),
+        output,
+    )
+    if log is not None:
+        log(
+            "{} orders matched, {} need a sub.".format(len(orders), len(needs_sub))
+        )
+
+    return needs_sub
+
+
+def main(argv=None):
+    """
+    Runs Auto Hunt from the command line.
+
+    :param argv: Arguments, defaults to sys.argv[1:]
+    :return: Exit status, 0 on success and 1 on failure
+    """
+    parser = argparse.ArgumentParser(
+        description="Find parts on order that need a sub added to SubHunt."
+    )
+    parser.add_argument("report", help="tab-delimited openPO report")
+    parser.add_argument(
+        "-o", "--output",
+        help="where to save the results, a .csv path saves plain CSV files "
+        "instead of a workbook (default: %(default)s)",
+        default=hunt_path(),
+    )
+    parser.add_argument(
+        "-p", "--parts-dir", default=PARTS_DIR,
+        help="directory holding allHDD/allMEM/allCPU.csv (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-d", "--database",
+        help="SQLite3 database, overrides SUBHUNT_DB and subhunt.ini",
+    )
+    parser.add_argument(
+        "-a", "--archive", help="also copy the report to this path while reading it",
+    )
+    args = parser.parse_args(argv)
+
+    if args.database is not None:
+        configure(db_path=args.database)
+
+    try:
+        missing = missing_tables([part_type.lower() for part_type in PART_TYPES])
+        if missing:
+            raise sqlite3.OperationalError("no such table: " + ", ".join(missing))
+        if create_connection() is None:
+            return 1
+        run_hunt(
+            args.report, args.output, args.parts_dir, args.archive, print, print
+        )
+    except (OSError, sqlite3.Error) as e:
+        print("Auto Hunt failed: " + str(e), file=sys.stderr)
+        return 1
+
+    print("Saved to " + args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
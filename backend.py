@@ -1,46 +1,159 @@
 """Handles the sqlite3 database."""
+import atexit
+import hashlib
 import sqlite3
-from csv import DictReader as csv_DictReader
+import threading
+import time
 from csv import writer as csvwriter
 from csv import reader as csvreader
 from collections import OrderedDict
-from os.path import basename
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from os import stat
+from os.path import abspath, basename, splitext
+from urllib.request import pathname2url
+
+from config import Settings
+from parts import record_class
+from migrations import (
+    SEARCH_COLUMNS,
+    create_row_hashes,
+    fts_table,
+    has_stale_specs,
+    migrate,
+    prepare_table,
+    refresh_specs,
+    row_hash_table,
+    specs_table,
+    sub_group_table,
+)
+
+
+settings = Settings()
+_pool = {}
+_column_names = {}
+_possible_values = {}
+_pool_lock = threading.Lock()
 
 
 def create_connection():
     """
-    Create a database connection to the SQLite3 database.
+    Return the calling thread's connection to the SQLite3 database.
+
+    Connections are opened once per thread and kept in a pool so every
+    call made from that thread reuses the same connection.
 
     :return: Connection object or None
     """
-    try:
-        conn = sqlite3.connect(r"db\parts.db")
+    conn = _pool.get(threading.get_ident())
+    if conn is not None:
         return conn
+
+    try:
+        conn = sqlite3.connect(settings.db_path, check_same_thread=False)
     except Exception as e:
         print(repr(e))
+        return None
+
+    try:
+        settings.apply(conn)
+        migrate(conn)
+    except Exception as e:
+        print(repr(e))
+        conn.close()
+        return None
+
+    with _pool_lock:
+        _prune_pool()
+        _pool[threading.get_ident()] = conn
+
+    return conn
 
-    return None
+
+def _prune_pool():
+    """Close pooled connections whose owning thread has exited."""
+    alive = {thread.ident for thread in threading.enumerate()}
+    for ident in [ident for ident in _pool if ident not in alive]:
+        try:
+            _pool.pop(ident).close()
+        except Exception as e:
+            print(repr(e))
 
 
 def close_connection(conn):
     """
-    Close database connection to the SQLite3 database.
+    Commit any pending writes on conn.  The connection itself stays
+    open in the pool; use close_all_connections to release it.
 
     :param conn: Connection object
     """
     try:
-        conn.commit()
-        conn.close()
+        if conn.in_transaction:
+            conn.commit()
     except Exception as e:
         print(repr(e))
 
 
-def create_table(create_table_sql):
+def close_all_connections():
+    """Commit and close every pooled connection."""
+    with _pool_lock:
+        for conn in _pool.values():
+            try:
+                if conn.in_transaction:
+                    conn.commit()
+                conn.close()
+            except Exception as e:
+                print(repr(e))
+        _pool.clear()
+
+
+atexit.register(close_all_connections)
+
+
+def configure(db_path=None, config_file=None, **pragmas):
+    """
+    Point the backend at a different database and/or connection
+    settings.  Pooled connections are closed so the next call opens
+    fresh ones with the new settings.
+
+    :param db_path: Path to the SQLite3 database file
+    :param config_file: Path to an ini file with a [database] section
+    :param pragmas: PRAGMA overrides, see config.DEFAULT_PRAGMAS
+    """
+    global settings
+    close_all_connections()
+    _column_names.clear()
+    _possible_values.clear()
+    settings = Settings(db_path, config_file, **pragmas)
+
+
+def missing_tables(tables):
+    """
+    Lists which of tables are not in the database.  The database file is
+    opened read/write only, so a mistyped path raises instead of leaving
+    a new empty database behind.
+
+    :param tables: Table names to look for
+    :raises sqlite3.OperationalError: If the database file can not be opened
+    :return: List of the missing table names
+    """
+    uri = "file:" + pathname2url(abspath(settings.db_path)) + "?mode=rw"
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        cur = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        names = {row[0] for row in cur}
+    finally:
+        conn.close()
+    return [table for table in tables if table not in names]
+
+
+def create_table(create_table_sql, table=None):
     """
     Create a table from the create_table_sql statement.
 
     :param conn: Connection object
     :param create_table_sql: a CREATE TABLE statement
+    :param table: Name of the table, if given its indexes are created too
     :return:
     """
     conn = create_connection()
@@ -48,9 +161,14 @@ def create_table(create_table_sql):
         try:
             cur = conn.cursor()
             cur.execute(create_table_sql)
+            if table is not None:
+                _column_names.pop(table.lower(), None)
+                table_changed(table)
+                prepare_table(conn, table)
             close_connection(conn)
             return True
         except Exception as e:
+            conn.rollback()
             print(e)
     else:
         print("Error! Unable to establish connection to the database.")
@@ -68,6 +186,13 @@ def remove_table(table):
         if conn is not None:
             cur = conn.cursor()
             cur.execute("DROP TABLE IF EXISTS " + table)
+            cur.execute("DROP TABLE IF EXISTS " + sub_group_table(table))
+            cur.execute("DROP TABLE IF EXISTS " + row_hash_table(table))
+            cur.execute("DROP TABLE IF EXISTS " + specs_table(table))
+            cur.execute("DROP TABLE IF EXISTS " + fts_table(table))
+            cur.execute("DELETE FROM sync_state WHERE table_name = ?", (table.lower(),))
+            _column_names.pop(table.lower(), None)
+            table_changed(table)
             close_connection(conn)
             return True
         else:
@@ -95,18 +220,72 @@ def return_table(table):
 
 def return_column_names(table):
     """
-    Return all column names from table
+    Return all column names from table.  Names are read from the
+    table's schema once and cached until the table is recreated.
 
     :param table:  Table to pull column names from
     """
-    conn = create_connection()
+    names = _column_names.get(table.lower())
+    if names is None:
+        conn = create_connection()
+        cur = conn.cursor()
+        cur.execute("PRAGMA table_info(" + table + ")")
+        names = [row[1] for row in cur.fetchall()]
+        if names:
+            _column_names[table.lower()] = names
 
-    cur = conn.cursor()
-    sql = "SELECT * FROM " + table
-    cur.execute(sql)
-    names = [description[0] for description in cur.description]
-    close_connection(conn)
-    return names
+    return list(names)
+
+
+def table_changed(table):
+    """
+    Forgets the values cached for table.  Called whenever the backend
+    writes to table.
+
+    :param table: Name of database table
+    """
+    _possible_values.pop(table.lower(), None)
+
+
+def return_all_possible_values(table):
+    """
+    Return the possible values of every column in table.  All columns
+    are read with a single statement and the result is cached until
+    the table changes.
+
+    :param table:  Table to search
+    :return: Dict of column -> sorted list of distinct, non-blank values
+    """
+    values = _possible_values.get(table.lower())
+    if values is None:
+        columns = return_column_names(table)
+        values = {column: [] for column in columns}
+        if columns:
+            conn = create_connection()
+            cur = conn.cursor()
+            cur.execute(
+                " UNION ALL ".join(
+                    "SELECT "
+                    + str(index)
+                    + ", "
+                    + column
+                    + " FROM (SELECT DISTINCT "
+                    + column
+                    + " FROM "
+                    + table
+                    + ")"
+                    for index, column in enumerate(columns)
+                )
+            )
+            for index, value in cur:
+                if value is not None and value != "":
+                    values[columns[index]].append(value)
+            close_connection(conn)
+            for column_values in values.values():
+                column_values.sort()
+            _possible_values[table.lower()] = values
+
+    return {column: list(column_values) for column, column_values in values.items()}
 
 
 def return_possible_values(table, column):
@@ -117,17 +296,7 @@ def return_possible_values(table, column):
     :param column:  Column with the values we want
     :return result:  List of values in column
     """
-    conn = create_connection()
-
-    cur = conn.cursor()
-    values = [value[0] for value in cur.execute("SELECT " + column + " FROM " + table)]
-    close_connection(conn)
-    result = []
-    for value in values:
-        if value not in result and value != "":
-            result.append(value)
-
-    return sorted(result)
+    return return_all_possible_values(table)[column]
 
 
 def part_in_db(table, part_num):
@@ -148,112 +317,632 @@ def part_in_db(table, part_num):
     return result
 
 
-def search_part(table, part):
+def get_part(table, part_num):
     """
-    Returns part info if part is in database.
+    Returns the record for part_num as a sqlite3.Row, which can be
+    indexed by position or column name.
 
-    :param conn: Connection object
     :param table: Name of database table
-    :param part: Part number
-    :return: Part info or None
+    :param part_num: Part number
+    :return: Row or None if part is not in the database
     """
     conn = create_connection()
 
     if conn is not None:
         cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
+        cur.execute("SELECT * FROM " + table + " WHERE part_num = ?", (part_num,))
+        return cur.fetchone()
+    else:
+        print("Error! Unable to connect to the database.")
 
-        if part_in_db(table, part):
-            cur.execute("SELECT * FROM " + table + " WHERE part_num = ?", (part,))
-            result = cur.fetchone()
-            close_connection(conn)
-            return result
+
+def part_factory(table):
+    """
+    Returns a sqlite3 row factory that builds typed records (see
+    parts.py) for rows selected from table by records_sql.
+
+    :param table: Name of database table
+    :raises ValueError: If table does not hold hdd, mem or cpu parts
+    :return: Callable taking (cursor, row)
+    """
+    cls = record_class(table)
+    names = {}
+
+    def factory(cursor, row):
+        columns = names.get(cursor.description)
+        if columns is None:
+            columns = [description[0] for description in cursor.description]
+            names[cursor.description] = columns
+        return cls.from_specs(dict(zip(columns, row)))
+
+    return factory
+
+
+def records_sql(table, columns):
+    """
+    Returns a query selecting columns of table (t) for part_factory.
+    Fields a record keeps parsed are read from the specs side table
+    (s), where they were stored when the part was written.
+
+    :param table: Name of database table
+    :param columns: Column names to select
+    :return: SQL as string
+    """
+    specs = record_class(table).SPECS
+    sql = (
+        "SELECT "
+        + ", ".join(
+            "s." + specs[column] + " AS " + column if column in specs else "t." + column
+            for column in columns
+        )
+        + " FROM "
+        + table
+        + " AS t"
+    )
+    if specs:
+        sql += " LEFT JOIN " + specs_table(table) + " AS s ON s.part_num = t.part_num"
+    return sql
+
+
+def get_records(table, part_nums=None, columns=None):
+    """
+    Returns parts from table as typed records with numeric capacity,
+    speed and height fields.
+
+    :param table: Name of database table
+    :param part_nums: Part numbers to fetch, or None for every part
+    :param columns: Columns to fetch, or None for every column.  Fields
+        not fetched are None.
+    :raises ValueError: If table does not hold hdd, mem or cpu parts
+    :return: List of HDD, MEM or CPU records
+    """
+    factory = part_factory(table)
+    conn = create_connection()
+    records = []
+
+    if conn is not None:
+        _refresh_specs(conn, table)
+        cur = conn.cursor()
+        cur.row_factory = factory
+        sql = records_sql(table, columns or return_column_names(table))
+        if part_nums is None:
+            cur.execute(sql)
+            records = cur.fetchall()
         else:
-            return None
+            for chunk in chunks(list(dict.fromkeys(part_nums)), MAX_VARIABLES):
+                cur.execute(
+                    sql
+                    + " WHERE t.part_num IN ("
+                    + ",".join("?" for part_num in chunk)
+                    + ")",
+                    chunk,
+                )
+                records.extend(cur.fetchall())
     else:
         print("Error! Unable to connect to the database.")
 
+    return records
+
+
+def search_part(table, part):
+    """
+    Returns part info if part is in database.
+
+    :param table: Name of database table
+    :param part: Part number
+    :return: Part info or None
+    """
+    result = get_part(table, part)
+    if result is not None:
+        return tuple(result)
+    return None
+
+
+SEARCH_TABLES = ("hdd", "mem", "cpu")
+SEARCH_LIMIT = 10
+
+# Sorts after every character that can follow a prefix, so
+# prefix <= value < prefix + _PREFIX_END holds for exactly the values
+# that start with prefix.
+_PREFIX_END = "\U0010ffff"
+
+
+def search_parts(prefix, limit=SEARCH_LIMIT, tables=SEARCH_TABLES):
+    """
+    Finds the parts whose part number, or OEM part number for CPUs,
+    starts with prefix, ignoring case.  Each column is searched with a
+    range scan of its case-insensitive index, so a lookup takes about
+    the same time however large the tables are.
+
+    :param prefix: Start of the part number
+    :param limit: Maximum number of matches to return
+    :param tables: Tables to search, missing tables are skipped
+    :return: List of (table, part number, matching value) sorted by
+        the matching value
+    """
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+
+    selects = []
+    params = []
+    for table in tables:
+        columns = return_column_names(table)
+        for column in SEARCH_COLUMNS.get(table_prefix(table), ()):
+            if column not in columns:
+                continue
+            selects.append(
+                "SELECT * FROM (SELECT ?, part_num, "
+                + column
+                + " FROM "
+                + table
+                + " WHERE "
+                + column
+                + " COLLATE NOCASE >= ? AND "
+                + column
+                + " COLLATE NOCASE < ? ORDER BY "
+                + column
+                + " COLLATE NOCASE LIMIT ?)"
+            )
+            params.extend((table, prefix, prefix + _PREFIX_END, limit))
+    if not selects:
+        return []
+
+    conn = create_connection()
+    cur = conn.cursor()
+    cur.execute(
+        " UNION ALL ".join(selects) + " ORDER BY 3 COLLATE NOCASE, 1", params
+    )
+    matches = []
+    seen = set()
+    for table, part_num, value in cur:
+        if (table, part_num) not in seen:
+            seen.add((table, part_num))
+            matches.append((table, part_num, value))
+    close_connection(conn)
+    return matches[:limit]
+
+
+FTS_LIMIT = 500
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query matching rows that contain
+    every word, or a word starting with it.  Each word is quoted
+    so punctuation such as "I7-3632QM" or "2.2G" is matched as typed
+    rather than read as query syntax.
+
+    :param text: Text typed by the user
+    :return: FTS5 query string, "" if text has no words
+    """
+    return " ".join(
+        '"' + word.replace('"', '""') + '"*' for word in text.split()
+    )
+
+
+def text_condition(table, text, use_fts=True):
+    """
+    Returns the SQL condition and parameters matching the rows of table
+    whose description, brand or OEM part number contain every word of
+    text.  With use_fts the table's FTS5 index is used, otherwise the
+    columns are scanned with LIKE.
+
+    :param table: Table to search
+    :param text: Words to search for
+    :param use_fts: Whether to use the FTS5 index
+    :return: (SQL fragment, list of parameters)
+    """
+    if use_fts:
+        fts = fts_table(table)
+        return (
+            table
+            + ".rowid IN (SELECT rowid FROM "
+            + fts
+            + " WHERE "
+            + fts
+            + " MATCH ?)",
+            [fts_query(text)],
+        )
+    columns = [
+        column
+        for column in ("description", "brand", "oem_part_num")
+        if column in return_column_names(table)
+    ]
+    if not columns:
+        return "0", []
+    words = text.split()
+    likes = [
+        "(" + " OR ".join(column + " LIKE ?" for column in columns) + ")"
+        for word in words
+    ]
+    return (
+        " AND ".join(likes),
+        ["%" + word + "%" for word in words for column in columns],
+    )
+
+
+def full_text_search(table, text, my_dict=None, limit=FTS_LIMIT):
+    """
+    Returns the rows of table whose description, brand or OEM part
+    number contain every word of text, best matches first, using the
+    table's FTS5 index.  If the index is missing (SQLite built without
+    FTS5) the columns are scanned with LIKE instead.
+
+    :param table: Table to search
+    :param text: Words to search for
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :param limit: Maximum number of rows to return, None for all
+    :return: List of rows
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    where, params = filter_where(table, my_dict or {})
+    limit_sql = " LIMIT " + str(int(limit)) if limit is not None else ""
+    fts = fts_table(table)
+
+    conn = create_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT "
+            + table
+            + ".* FROM (SELECT rowid, rank FROM "
+            + fts
+            + " WHERE "
+            + fts
+            + " MATCH ?) AS f JOIN "
+            + table
+            + " ON "
+            + table
+            + ".rowid = f.rowid"
+            + where
+            + " ORDER BY f.rank"
+            + limit_sql,
+            [query] + params,
+        )
+    except sqlite3.OperationalError:
+        condition, values = text_condition(table, text, False)
+        cur.execute(
+            "SELECT * FROM "
+            + table
+            + (where + " AND " if where else " WHERE ")
+            + condition
+            + limit_sql,
+            params + values,
+        )
+    result = cur.fetchall()
+    close_connection(conn)
+    return result
+
+
+class Between:
+    """
+    A range filter for filter_columns.  Either end may be None to leave
+    the range open on that side; both ends are inclusive.
+
+    :param low: Smallest accepted value
+    :param high: Largest accepted value
+    """
+
+    __slots__ = ("low", "high")
+
+    def __init__(self, low=None, high=None):
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return "Between({!r}, {!r})".format(self.low, self.high)
+
+
+def filter_condition(column, value):
+    """
+    Returns the SQL condition and parameters filtering column by value.
+    A Between gives a range, a list, tuple or set gives an IN list and
+    anything else an equality test.
+
+    :param column: Validated column name
+    :param value: Desired value(s)
+    :return: (SQL fragment, list of parameters)
+    """
+    if isinstance(value, Between):
+        fragments = []
+        params = []
+        if value.low is not None:
+            fragments.append(column + " >= ?")
+            params.append(value.low)
+        if value.high is not None:
+            fragments.append(column + " <= ?")
+            params.append(value.high)
+        return " AND ".join(fragments) or "1", params
+    if isinstance(value, (list, tuple, set, frozenset)):
+        params = sorted(value, key=str)
+        if not params:
+            return "0", params
+        return column + " IN (" + ",".join("?" for param in params) + ")", params
+    return column + " = ?", [value]
+
+
+def filter_where(table, my_dict):
+    """
+    Returns the WHERE clause and parameters for the filters in
+    my_dict.  Column names are checked against the table's cached
+    column names and all values are bound as parameters, so the same
+    filter shape always produces the same SQL and reuses the
+    connection's prepared statement.
+
+    :param table: Table we're filtering
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :return: (SQL, list of parameters), SQL is "" if there are no filters
+    """
+    columns = return_column_names(table)
+    if not columns:
+        raise ValueError("Unknown table: " + table)
+
+    fragments = []
+    params = []
+    for column in sorted(my_dict):
+        if column not in columns:
+            raise ValueError("Unknown column for " + table + ": " + column)
+        fragment, values = filter_condition(column, my_dict[column])
+        fragments.append(fragment)
+        params.extend(values)
+
+    if not fragments:
+        return "", params
+    return " WHERE " + " AND ".join(fragments), params
+
+
+def filter_query(table, my_dict):
+    """
+    Returns the SQL and parameters selecting the rows of table that
+    match every filter in my_dict.
+
+    :param table: Table we're filtering
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :return: (SQL, list of parameters)
+    """
+    where, params = filter_where(table, my_dict)
+    return "SELECT * FROM " + table + where, params
+
 
 def filter_columns(table, my_dict):
     """
     Selects all records from db table where my_dict[column] = "desired value"
 
+    Values may also be a list, tuple or set to accept any of several
+    values, or a Between for a range, e.g.
+    {"brand": ["Acer", "Lenovo"], "hdd_capacity": "500"}.
+
     :param table:  Table we're filtering
-    :param my_dcit: Dictionary of columns and desired values
+    :param my_dict: Dictionary of columns and desired values
+    :return: List of matching rows
     """
+    sql, params = filter_query(table, my_dict)
     conn = create_connection()
-    sql_fragments = []
-    for k, v in my_dict.items():
-        sql_fragments.append(k + " = '" + v + "'")
-
     if conn is not None:
         cur = conn.cursor()
-        sql = "SELECT * FROM " + table.lower() + " WHERE " + " AND ".join(sql_fragments)
-        cur.execute(sql)
+        cur.execute(sql, params)
         result = cur.fetchall()
         close_connection(conn)
         return result
 
 
-def add_part(table, part_info):
+PAGE_SIZE = 200
+
+
+def count_rows(table, my_dict=None):
     """
-    Adds part to the SQLite3 database.
+    Counts the rows of table matching the filters in my_dict.
+
+    :param table: Table we're filtering
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :return: Number of rows
+    """
+    where, params = filter_where(table, my_dict or {})
+    conn = create_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM " + table + where, params)
+    result = cur.fetchone()[0]
+    close_connection(conn)
+    return result
+
+
+def get_page(table, my_dict=None, after=None, before=None, limit=PAGE_SIZE):
+    """
+    Returns one page of the rows of table matching the filters in
+    my_dict, in part number order.  Pages are found by key rather than
+    by offset, so fetching a page deep into a large table costs the
+    same as fetching the first one.
+
+    :param table: Table we're filtering
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :param after: Return the rows following this part number
+    :param before: Return the rows preceding this part number
+    :param limit: Maximum number of rows to return
+    :return: List of rows
+    """
+    where, params = filter_where(table, my_dict or {})
+    order = "ASC"
+    if after is not None or before is not None:
+        where += " AND " if where else " WHERE "
+        if before is not None:
+            where += "part_num < ?"
+            params.append(before)
+            order = "DESC"
+        else:
+            where += "part_num > ?"
+            params.append(after)
+    params.append(limit)
+
+    conn = create_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT * FROM " + table + where + " ORDER BY part_num " + order + " LIMIT ?",
+        params,
+    )
+    result = cur.fetchall()
+    close_connection(conn)
+    if order == "DESC":
+        result.reverse()
+    return result
+
+
+def iter_pages(table, my_dict=None, limit=PAGE_SIZE):
+    """
+    Yields every row of table matching the filters in my_dict, one
+    page at a time.
+
+    :param table: Table we're filtering
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :param limit: Number of rows fetched per query
+    """
+    page = get_page(table, my_dict, limit=limit)
+    while page:
+        yield from page
+        page = get_page(table, my_dict, after=page[-1][0], limit=limit)
+
+
+def facet_counts(table, my_dict, text=""):
+    """
+    Counts the values of every column among the rows matching the
+    filters in my_dict, all in one grouped query.  Each column is
+    counted with every filter except its own, so the counts show what
+    choosing a different value for that column would return.
+
+    :param table: Table we're filtering
+    :param my_dict: Dictionary of columns and desired values, see
+        filter_condition
+    :param text: Words the rows must also contain, see full_text_search
+    :return: Dict of column -> list of (value, count) sorted by value,
+        leaving out blank values and values with no matching rows
+    """
+    columns = return_column_names(table)
+    counts = {column: [] for column in columns}
+    if not columns:
+        return counts
+
+    def query(use_fts):
+        """Returns the grouped query and its parameters."""
+        selects = []
+        params = []
+        for index, column in enumerate(columns):
+            where, values = filter_where(
+                table, {k: v for k, v in my_dict.items() if k != column}
+            )
+            if fts_query(text):
+                condition, text_values = text_condition(table, text, use_fts)
+                where += (" AND " if where else " WHERE ") + condition
+                values += text_values
+            selects.append(
+                "SELECT "
+                + str(index)
+                + ", "
+                + column
+                + ", count(*) FROM "
+                + table
+                + where
+                + " GROUP BY "
+                + column
+            )
+            params.extend(values)
+        return " UNION ALL ".join(selects), params
+
+    conn = create_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(*query(True))
+    except sqlite3.OperationalError:
+        if not fts_query(text):
+            raise
+        cur.execute(*query(False))
+    for index, value, count in cur:
+        if value is not None and value != "":
+            counts[columns[index]].append((value, count))
+    close_connection(conn)
+    for column_counts in counts.values():
+        column_counts.sort()
+
+    return counts
+
+
+def table_columns(table):
+    """
+    Returns the column names of table, creating it with the standard
+    headers for its part type if it does not exist yet.  Names come
+    from the cache kept by return_column_names.
 
     :param table: Name of database table
-    :param part: part_info to add
+    :return: List of column names, empty if table could not be created
+    """
+    columns = return_column_names(table)
+    if not columns and table_prefix(table) is not None:
+        create_table(
+            "CREATE TABLE IF NOT EXISTS "
+            + table
+            + "("
+            + ",".join(TABLE_HEADERS[table_prefix(table)])
+            + ");",
+            table,
+        )
+        columns = return_column_names(table)
+    return columns
+
+
+def add_parts(table, rows):
+    """
+    Adds many parts to the SQLite3 database in a single transaction.
+    Parts already in the database are left as they are.
+
+    :param table: Name of database table
+    :param rows: Iterable of part_info sequences
     :return: "Done"
     """
     conn = create_connection()
     if conn is not None:
+        columns = table_columns(table)
+        if not columns:
+            print("Error! Unknown table " + table + ".")
+            return None
         cur = conn.cursor()
-        if table.startswith("hdd"):
-            headers = [
-                "part_num PRIMARY KEY",
-                "brand",
-                "connector",
-                "hdd_capacity",
-                "ssd_capacity",
-                "speed",
-                "type",
-                "physical_size",
-                "height",
-                "interface",
-                "description",
-                "do_not_sub",
-                "subbed",
-            ]
-        if table.startswith("mem"):
-            headers = [
-                "part_num PRIMARY KEY",
-                "speed",
-                "brand",
-                "connector",
-                "capacity",
-                "description",
-                "do_not_sub",
-                "subbed",
-            ]
-        if table.startswith("cpu"):
-            headers = [
-                "part_num PRIMARY KEY",
-                "brand",
-                "description",
-                "oem_part_num",
-                "do_not_sub",
-                "subbed",
-            ]
-        create_table(
-            "CREATE TABLE IF NOT EXISTS " + table + "(" + ",".join(headers) + ");"
+        sql = (
+            "INSERT OR IGNORE INTO "
+            + table
+            + " VALUES ("
+            + ",".join("?" for column in columns)
+            + ");"
         )
-        cur.execute("SELECT * FROM " + table + ";")
-        columns = ["?" for list in cur.description]
-        sql = "INSERT OR IGNORE INTO " + table + " VALUES (" + ",".join(columns) + ");"
-        cur.execute(sql, part_info)
+        try:
+            cur.executemany(sql, rows)
+        except sqlite3.Error:
+            conn.rollback()
+            raise
         close_connection(conn)
+        table_changed(table)
         return "Done"
     else:
         print("Error! Unable to connect to the database.")
 
 
+def add_part(table, part_info):
+    """
+    Adds part to the SQLite3 database.
+
+    :param table: Name of database table
+    :param part: part_info to add
+    :return: "Done"
+    """
+    return add_parts(table, [part_info])
+
+
 def remove_part(table, part_num):
     """
     Removes a part from the SQLite3 databse.
@@ -264,15 +953,17 @@ def remove_part(table, part_num):
     """
     conn = create_connection()
     if conn is not None:
-        if part_in_db(table, part_num):
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM " + table + ";")
-            sql = "DELETE FROM " + table + " WHERE part_num = ?"
-            cur.execute(sql, (part_num,))
-            close_connection(conn)
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM " + table + " WHERE part_num = ?", (part_num,))
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        close_connection(conn)
+        table_changed(table)
+        if cur.rowcount:
             return "Done"
-        else:
-            return None
+        return None
     else:
         print("Error! Unable to connect to the database.")
 
@@ -284,19 +975,12 @@ def convert_to_dict(table, part_num):
 
     :param table: Name of database table
     :param part_num: Part number as string
-    :return: Record of part_num
+    :return: Record of part_num or None
     """
-    conn = create_connection()
-    if conn is not None:
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM " + table + ";")
-        headers = [list[0] for list in cur.description]
-        part_info = search_part(table, part_num)
-        part_dict = OrderedDict(zip(headers, part_info))
-        close_connection(conn)
-        return part_dict
-    else:
-        print("Error! Unable to connect the database.")
+    part_info = get_part(table, part_num)
+    if part_info is not None:
+        return OrderedDict(zip(part_info.keys(), part_info))
+    return None
 
 
 def update_part(table, part_info):
@@ -309,179 +993,739 @@ def update_part(table, part_info):
     conn = create_connection()
     if conn is not None:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM " + table + ";")
-        columns = ["?" for list in cur.description]
-        sql = "REPLACE INTO " + table + " VALUES (" + ",".join(columns) + ");"
-        cur.execute(sql, part_info)
+        columns = return_column_names(table)
+        sql = (
+            "INSERT INTO "
+            + table
+            + " VALUES ("
+            + ",".join("?" for column in columns)
+            + ") ON CONFLICT(part_num) DO UPDATE SET "
+            + ", ".join(column + " = excluded." + column for column in columns[1:])
+        )
+        try:
+            cur.execute(sql, part_info)
+        except sqlite3.Error:
+            conn.rollback()
+            raise
         close_connection(conn)
+        table_changed(table)
         return "Done"
     else:
         print("Error! Unable to connect to the database.")
 
 
-def list_subs(table, part_num):
+def sort_subs(part_num, results):
+    """
+    Places the row for part_num at index 0 of results.
+
+    :param part_num: Part number as string
+    :param results: List of subs as returned by list_subs
+    :return: results
+    """
+    for result in results:
+        if part_num in result:
+            results.insert(0, results.pop(results.index(result)))
+    return results
+
+
+def list_subs(table, part_num, relaxed=False):
     """
     Compares to parts to see if they are valid subs.
 
     :param table: Name of database table
     :param part_num: Part number as string
+    :param relaxed: Also accept larger capacities and faster speeds
     :return: List of subs for part_num
     """
-    conn = create_connection()
+    return list_subs_many(table, [part_num], relaxed)[part_num]
+
+
+# Table prefix -> headers used when add_part creates the table.
+TABLE_HEADERS = {
+    "hdd": (
+        "part_num PRIMARY KEY",
+        "brand",
+        "connector",
+        "hdd_capacity",
+        "ssd_capacity",
+        "speed",
+        "type",
+        "physical_size",
+        "height",
+        "interface",
+        "description",
+        "do_not_sub",
+        "subbed",
+    ),
+    "mem": (
+        "part_num PRIMARY KEY",
+        "speed",
+        "brand",
+        "connector",
+        "capacity",
+        "description",
+        "do_not_sub",
+        "subbed",
+    ),
+    "cpu": (
+        "part_num PRIMARY KEY",
+        "brand",
+        "description",
+        "oem_part_num",
+        "do_not_sub",
+        "subbed",
+    ),
+}
+
+# Number of CSV rows inserted per transaction by import_from_csv.
+CHUNK_SIZE = 5000
+
+# Largest number of bound parameters used in a single statement, kept
+# under SQLite's historic limit of 999.
+MAX_VARIABLES = 900
+
+# Table prefix -> columns returned for each sub by list_subs.
+SUB_COLUMNS = {
+    "hdd": (
+        "brand",
+        "part_num",
+        "type",
+        "physical_size",
+        "height",
+        "connector",
+        "hdd_capacity",
+        "ssd_capacity",
+        "speed",
+        "subbed",
+    ),
+    "mem": ("brand", "part_num", "connector", "capacity", "speed", "subbed"),
+    "cpu": ("brand", "part_num", "oem_part_num", "description", "subbed"),
+}
+
+# Table prefix -> brand whose parts can sub for any other brand.
+HOUSE_BRANDS = {"hdd": "CVO", "mem": "CVO", "cpu": "GPC"}
+
+
+def table_prefix(table):
+    """
+    Returns the part type prefix ("hdd", "mem" or "cpu") of table.
+
+    :param table: Name of database table
+    :return: Prefix or None
+    """
+    for prefix in SUB_COLUMNS:
+        if table.lower().startswith(prefix):
+            return prefix
+    return None
+
+
+def chunks(items, size):
+    """
+    Yields successive lists of at most size items.
+
+    :param items: List to split
+    :param size: Maximum length of each chunk
+    """
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def get_parts(table, part_nums, columns=("*",)):
+    """
+    Returns the records for many parts using chunked IN queries.
 
-    def sort_results(results):
-        """Places part_num at index 0 of the list"""
-        for result in results:
-            if part_num in result:
-                results.insert(0, results.pop(results.index(result)))
-        return results
+    :param table: Name of database table
+    :param part_nums: Iterable of part numbers
+    :param columns: Columns to fetch, part_num is always included
+    :return: Dict of part number -> sqlite3.Row for parts in the database
+    :raises sqlite3.OperationalError: If table does not exist
+    """
+    conn = create_connection()
+    found = {}
 
     if conn is not None:
         cur = conn.cursor()
-        part_dict = convert_to_dict(table, part_num)
-        if table.startswith("hdd"):
-            if part_dict["connector"] == "m.2":
-                sql = (
-                    "SELECT brand, part_num, type, physical_size, height, \
-                       connector, hdd_capacity, ssd_capacity, speed, subbed \
-                       FROM "
-                    + table
-                    + " WHERE (brand = 'CVO' OR brand = ?) \
-                       AND type = ? AND physical_size = ? AND connector = ? \
-                       AND ssd_capacity = ? AND do_not_sub = 'FALSE' \
-                       AND interface like ?"
-                )
-                values = (
-                    part_dict["brand"],
-                    part_dict["type"],
-                    part_dict["physical_size"],
-                    part_dict["connector"],
-                    part_dict["ssd_capacity"],
-                    part_dict["interface"],
-                )
-            else:
-                sql = (
-                    "SELECT brand, part_num, type, physical_size, height, \
-                       connector, hdd_capacity, ssd_capacity, speed, subbed \
-                       FROM "
-                    + table
-                    + " WHERE (brand = 'CVO' OR brand = ?) \
-                       AND type = ? AND physical_size = ? AND (height = '' \
-                       OR height = ?) AND connector = ? AND hdd_capacity = ? \
-                       AND ssd_capacity = ? AND speed = ? \
-                       AND do_not_sub = 'FALSE'"
-                )
-                values = (
-                    part_dict["brand"],
-                    part_dict["type"],
-                    part_dict["physical_size"],
-                    part_dict["height"],
-                    part_dict["connector"],
-                    part_dict["hdd_capacity"],
-                    part_dict["ssd_capacity"],
-                    part_dict["speed"],
-                )
-            cur.execute(sql, values)
-            # results = [list(filter(None, lst)) for lst in cur.fetchall()]
-            results = cur.fetchall()
-            return sort_results(results)
-        if table.startswith("mem"):
-            sql = (
-                "SELECT brand, part_num, connector, capacity, speed, subbed \
-                   FROM "
-                + table
-                + " WHERE (brand = 'CVO' OR brand = ?) AND \
-                   connector = ? AND capacity = ? AND speed = ? AND \
-                   do_not_sub = 'FALSE'"
-            )
+        cur.row_factory = sqlite3.Row
+        select = ", ".join(("part_num",) + tuple(columns))
+        for chunk in chunks(list(dict.fromkeys(part_nums)), MAX_VARIABLES):
             cur.execute(
-                sql,
-                (
-                    part_dict["brand"],
-                    part_dict["connector"],
-                    part_dict["capacity"],
-                    part_dict["speed"],
-                ),
-            )
-            results = cur.fetchall()
-            return sort_results(results)
-        if table.startswith("cpu"):
-            sql = (
-                "SELECT brand, part_num, oem_part_num, description, subbed \
-                   FROM "
+                "SELECT "
+                + select
+                + " FROM "
                 + table
-                + " WHERE (brand = 'GPC' or brand = ?) AND \
-                    oem_part_num = ? AND do_not_sub = 'FALSE'"
+                + " WHERE part_num IN ("
+                + ",".join("?" for part_num in chunk)
+                + ")",
+                chunk,
             )
-            cur.execute(sql, (part_dict["brand"], part_dict["oem_part_num"]))
-            results = cur.fetchall()
-        close_connection(conn)
-        return sort_results(results)
+            for row in cur.fetchall():
+                found[row["part_num"]] = row
+    else:
+        print("Error! Unable to connect to the database.")
+
+    return found
+
+
+def _at_least(column):
+    """
+    Returns the relaxed matching condition that the sub's (s) value of
+    a specs column is no smaller than the part's (ps).
+    """
+    return (
+        "(s." + column + " >= ps." + column
+        + " OR (s." + column + " IS NULL AND ps." + column + " IS NULL))"
+    )
+
+
+# Table prefix -> conditions on the specs side table applied instead of
+# exact matching when list_subs is called with relaxed=True.  Larger
+# drives and memory, faster drives and memory, and thinner drives are
+# all acceptable subs.
+RELAXED_RULES = {
+    "hdd": (
+        _at_least("hdd_bytes"),
+        _at_least("ssd_bytes"),
+        _at_least("rpm"),
+        "(p.connector = 'm.2' OR s.height_mm IS NULL OR s.height_mm <= ps.height_mm)",
+    ),
+    "mem": (_at_least("capacity_bytes"), _at_least("mts")),
+}
+
+
+def _subs_sql(table, where, relaxed=False):
+    """
+    Returns a query listing subs (t) for parts (p) matching where.
+    Candidates are found through the sub group side table, so the
+    search is an indexed equality lookup on the group key.  With
+    relaxed, candidates come from the specs side table instead: an
+    equality lookup on the relaxed key plus range conditions on the
+    normalised numeric specs.
+
+    :param table: Name of database table
+    :param where: SQL condition on p
+    :param relaxed: Allow larger capacities and faster speeds
+    :return: SQL selecting p.part_num followed by the SUB_COLUMNS of t
+    """
+    prefix = table_prefix(table)
+    conditions = [
+        where,
+        "(t.brand = '" + HOUSE_BRANDS[prefix] + "' OR t.brand = p.brand)",
+        "t.do_not_sub = 'FALSE'",
+    ]
+
+    if relaxed and prefix in RELAXED_RULES:
+        side_table = specs_table(table)
+        own, other, key = "ps", "s", "relaxed_key"
+        conditions.extend(RELAXED_RULES[prefix])
+    else:
+        side_table = sub_group_table(table)
+        own, other, key = "pg", "g", "group_key"
+        if prefix == "hdd":
+            conditions.append(
+                "(p.connector = 'm.2' OR t.height = '' OR t.height = p.height)"
+            )
+
+    return (
+        "SELECT p.part_num, "
+        + ", ".join("t." + column for column in SUB_COLUMNS[prefix])
+        + " FROM "
+        + table
+        + " AS p JOIN "
+        + side_table
+        + " AS " + own + " ON " + own + ".part_num = p.part_num JOIN "
+        + side_table
+        + " AS " + other + " ON " + other + "." + key + " = " + own + "." + key
+        + " JOIN "
+        + table
+        + " AS t ON t.part_num = " + other + ".part_num WHERE "
+        + " AND ".join(conditions)
+    )
+
+
+def _refresh_specs(conn, table):
+    """
+    Parses the specs of parts written since the last relaxed match,
+    including parts written by other SQLite clients, under a write lock.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    if not has_stale_specs(conn, table):
+        return
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        refresh_specs(conn, table)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def list_subs_many(table, part_nums, relaxed=False):
+    """
+    Lists subs for many part numbers at once using chunked queries
+    joined on the precomputed sub group keys.  With relaxed, parts
+    without a relaxed key, e.g. memory of unknown generation, are
+    matched exactly.
+
+    :param table: Name of database table
+    :param part_nums: Iterable of part numbers
+    :param relaxed: Also accept larger capacities and faster speeds
+    :return: Dict of part number -> list of subs, as returned by
+        list_subs.  Parts not in the database map to an empty list.
+    """
+    part_nums = list(dict.fromkeys(part_nums))
+    result = {part_num: [] for part_num in part_nums}
+    conn = create_connection()
+
+    if conn is not None:
+        relaxed = relaxed and table_prefix(table) in RELAXED_RULES
+        if relaxed:
+            _refresh_specs(conn, table)
+        cur = conn.cursor()
+        for chunk in chunks(part_nums, MAX_VARIABLES):
+            where = "p.part_num IN (" + ",".join("?" for part_num in chunk) + ")"
+            queries = [_subs_sql(table, where, relaxed)]
+            if relaxed:
+                queries.append(
+                    _subs_sql(
+                        table,
+                        where
+                        + " AND p.part_num IN (SELECT part_num FROM "
+                        + specs_table(table)
+                        + " WHERE relaxed_key IS NULL)",
+                    )
+                )
+            for query in queries:
+                cur.execute(query, chunk)
+                for row in cur.fetchall():
+                    result[row[0]].append(row[1:])
+        for part_num, subs in result.items():
+            sort_subs(part_num, subs)
     else:
         print("Error! Unable to connect to the database.")
 
+    return result
+
 
 def is_valid_sub(table, part_num, other_part_num):
     """
-    Calls list_subs and then checks in other_part_num is
-    in the list of subs returns.
+    Checks if other_part_num is a valid sub for part_num by comparing
+    their sub group keys.
 
     :param table: Name of database table
     :param part_num: Part number as string
     :param other_part_num: Part number to check as string
     :return: True or False
     """
-    if part_in_db(table, part_num) and part_in_db(table, other_part_num):
-        subs = list_subs(table, part_num)
-        return any(lst[1] == other_part_num for lst in subs)
+    conn = create_connection()
+
+    if conn is not None:
+        cur = conn.cursor()
+        cur.execute(
+            _subs_sql(table, "p.part_num = ? AND t.part_num = ?"),
+            (part_num, other_part_num),
+        )
+        return cur.fetchone() is not None
     else:
+        print("Error! Unable to connect to the database.")
         return False
 
 
-def import_from_csv(file):
+def csv_table_name(file):
     """
-    Import lines from file into SQLite3 database.
+    Returns the name of the table file is imported into.
+
+    :param file: Path of a CSV file
+    """
+    return splitext(basename(file))[0].lower()
+
+
+def read_csv_headers(file):
+    """
+    Returns the header row of file.
+
+    :param file: Path of a CSV file
+    :return: List of column names
+    """
+    with open(file, "r", newline="") as csvfile:
+        return next(csvreader(csvfile), [])
+
+
+def normalise_row(row, width):
+    """
+    Strips values ending in a non-breaking space and pads or trims row
+    to width values.
+
+    :param row: List of values from a CSV file
+    :param width: Number of columns in the table
+    :return: Normalised list of values
+    """
+    values = [value.strip() if value.endswith("\xa0") else value for value in row[:width]]
+    if len(values) < width:
+        values.extend([None] * (width - len(values)))
+    return values
+
+
+def read_csv_chunks(file, chunk_size=CHUNK_SIZE):
+    """
+    Yields the normalised data rows of file in lists of at most
+    chunk_size rows, skipping blank lines.  Only one chunk is held in
+    memory at a time.
+
+    :param file: Path of a CSV file
+    :param chunk_size: Number of rows per chunk
+    """
+    with open(file, "r", newline="") as csvfile:
+        reader = csvreader(csvfile)
+        width = len(next(reader, []))
+        chunk = []
+        for row in reader:
+            if not row:
+                continue
+            chunk.append(normalise_row(row, width))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def insert_rows(table, rows, width):
+    """
+    Inserts rows into table in a single transaction, ignoring parts
+    that are already in the database.
+
+    :param table: Name of database table
+    :param rows: List of rows, each with width values
+    :param width: Number of columns in the table
+    :return: Number of rows inserted
+    """
+    conn = create_connection()
+    cur = conn.cursor()
+    try:
+        cur.executemany(
+            "INSERT OR IGNORE INTO "
+            + table
+            + " VALUES ("
+            + ",".join("?" for column in range(width))
+            + ")",
+            rows,
+        )
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    inserted = cur.rowcount
+    close_connection(conn)
+    table_changed(table)
+    return inserted
+
+
+def import_from_csv(file, progress=None, chunk_size=CHUNK_SIZE):
+    """
+    Import lines from file into SQLite3 database.  The file is read
+    and inserted chunk_size rows at a time, each chunk in its own
+    transaction, so memory use stays flat however large the file is.
 
     :param file: File to import.
+    :param progress: Callable taking (rows read so far, rows per second),
+        called after each chunk
+    :param chunk_size: Number of rows per chunk
+    :return: Dict with the number of rows "read" and "inserted"
     """
+    stats = {"read": 0, "inserted": 0}
     conn = create_connection()
 
     if conn is not None:
-        table = basename(file).lower()[:-4]
-        with open(file, "r") as csvfile:
-            reader = csv_DictReader(csvfile)
-            first_row = next(reader)
-            headers = [header for header, value in first_row.items()]
-            headers[0] = "part_num PRIMARY KEY"
-
-            create_table(
-                "CREATE TABLE IF NOT EXISTS " + table + "(" + ",".join(headers) + ");"
+        table = csv_table_name(file)
+        headers = read_csv_headers(file)
+        if not headers:
+            return stats
+        headers[0] = "part_num PRIMARY KEY"
+
+        create_table(
+            "CREATE TABLE IF NOT EXISTS " + table + "(" + ",".join(headers) + ");",
+            table,
+        )
+
+        start = time.perf_counter()
+        for chunk in read_csv_chunks(file, chunk_size):
+            stats["inserted"] += insert_rows(table, chunk, len(headers))
+            stats["read"] += len(chunk)
+            if progress is not None:
+                elapsed = time.perf_counter() - start
+                progress(stats["read"], stats["read"] / elapsed if elapsed else 0.0)
+    else:
+        print("Error! Unable to connect to the database.")
+
+    return stats
+
+
+def _parse_csv(file, chunk_size, queue):
+    """
+    Process pool worker for import_many.  Parses and normalises file
+    and puts (file, kind, payload) messages on queue: "headers" once,
+    "rows" per chunk, "error" if the file cannot be read, then "done".
+    """
+    try:
+        queue.put((file, "headers", read_csv_headers(file)))
+        for chunk in read_csv_chunks(file, chunk_size):
+            queue.put((file, "rows", chunk))
+    except Exception as e:
+        queue.put((file, "error", repr(e)))
+    queue.put((file, "done", None))
+
+
+def _write_imports(queue, stats):
+    """
+    Writer thread for import_many.  Applies every message from queue to
+    the database until it receives None, filling in stats as it goes.
+    A message that fails only records the file's error, so the queue
+    keeps being drained and the parsers never block on a full queue.
+    """
+    widths = {}
+    while True:
+        message = queue.get()
+        if message is None:
+            return
+        file, kind, payload = message
+        file_stats = stats[file]
+        table = csv_table_name(file)
+        if kind == "headers":
+            file_stats["start"] = time.perf_counter()
+            widths[file] = len(payload)
+            if payload:
+                payload[0] = "part_num PRIMARY KEY"
+                try:
+                    create_table(
+                        "CREATE TABLE IF NOT EXISTS "
+                        + table
+                        + "("
+                        + ",".join(payload)
+                        + ");",
+                        table,
+                    )
+                except Exception as e:
+                    file_stats["error"] = repr(e)
+        elif kind == "rows":
+            try:
+                file_stats["inserted"] += insert_rows(table, payload, widths[file])
+            except Exception as e:
+                file_stats["failed"] += len(payload)
+                file_stats["error"] = repr(e)
+            file_stats["read"] += len(payload)
+        elif kind == "error":
+            file_stats["error"] = payload
+        elif kind == "done":
+            file_stats["ignored"] = (
+                file_stats["read"] - file_stats["inserted"] - file_stats["failed"]
             )
+            start = file_stats.pop("start", None)
+            if start is not None:
+                file_stats["elapsed"] = time.perf_counter() - start
+
 
-            to_import = [list(row.values()) for row in reader]
-            to_import.append(list(first_row.values()))
+def import_many(files, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Imports several CSV files at once.  Files are parsed and normalised
+    in a process pool while a single writer thread inserts their rows,
+    so SQLite only ever sees one writer.  The queue between them is
+    bounded to keep memory use flat.
+
+    :param files: Paths of the CSV files to import
+    :param workers: Number of parser processes, defaults to one per CPU
+    :param chunk_size: Number of rows per chunk
+    :return: Dict of file -> stats with the number of rows "read",
+        "inserted", "ignored" as duplicates and "failed" in chunks that
+        could not be written, seconds "elapsed" and, if the import
+        failed, the last "error" message
+    """
+    files = list(dict.fromkeys(files))
+    stats = {
+        file: {"read": 0, "inserted": 0, "ignored": 0, "failed": 0, "elapsed": 0.0}
+        for file in files
+    }
+
+    with Manager() as manager:
+        queue = manager.Queue(maxsize=32)
+        writer = threading.Thread(target=_write_imports, args=(queue, stats))
+        writer.start()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for future in [
+                    pool.submit(_parse_csv, file, chunk_size, queue) for file in files
+                ]:
+                    future.result()
+        finally:
+            queue.put(None)
+            writer.join()
 
-            for list_item in to_import:
-                for item in list_item:
-                    if item.endswith("\xa0"):
-                        index_of_list = to_import.index(list_item)
-                        index_of_item = list_item.index(item)
-                        to_import[index_of_list][index_of_item] = item.strip()
+    return stats
 
-            cur = conn.cursor()
-            columns = ["?" for item in headers]
-            cur.executemany(
-                "INSERT OR IGNORE INTO "
+
+def import_summary(stats):
+    """
+    Returns a human readable summary of the stats from import_many.
+
+    :param stats: Dict returned by import_many
+    :return: Summary as a string, one line per file plus a total
+    """
+    lines = []
+    for file, file_stats in stats.items():
+        line = "{}: {} read, {} inserted, {} duplicates ignored, {} failed, {:.2f}s".format(
+            file,
+            file_stats["read"],
+            file_stats["inserted"],
+            file_stats["ignored"],
+            file_stats["failed"],
+            file_stats["elapsed"],
+        )
+        if "error" in file_stats:
+            line += " (" + file_stats["error"] + ")"
+        lines.append(line)
+    lines.append(
+        "Total: {} read, {} inserted, {} duplicates ignored, {} failed".format(
+            sum(file_stats["read"] for file_stats in stats.values()),
+            sum(file_stats["inserted"] for file_stats in stats.values()),
+            sum(file_stats["ignored"] for file_stats in stats.values()),
+            sum(file_stats["failed"] for file_stats in stats.values()),
+        )
+    )
+    return "\n".join(lines)
+
+
+def row_hash(row):
+    """
+    Returns a content hash of a normalised CSV row.
+
+    :param row: List of values
+    :return: Hex digest as string
+    """
+    content = "\x1f".join("" if value is None else str(value) for value in row)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def sync_from_csv(file, delete_missing=False, chunk_size=CHUNK_SIZE):
+    """
+    Brings the table for file up to date with it.  New parts are
+    inserted and changed parts updated in place; rows whose content
+    hash matches the last sync are left alone.  If the file's size and
+    modification time match the last sync it is skipped without being
+    read, unless delete_missing is set, since parts may have been added
+    to the table since.
+
+    :param file: Path of a CSV file
+    :param delete_missing: Also remove parts that are not in file
+    :param chunk_size: Number of rows per transaction
+    :return: Dict with the number of rows "read", "inserted",
+        "updated", "unchanged" and "deleted", and whether the file was
+        "skipped"
+    """
+    stats = {
+        "read": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "deleted": 0,
+        "skipped": False,
+    }
+    conn = create_connection()
+    if conn is None:
+        print("Error! Unable to connect to the database.")
+        return stats
+
+    table = csv_table_name(file)
+    path = abspath(file)
+    info = stat(file)
+    cur = conn.cursor()
+    cur.execute("SELECT table_name, size, mtime_ns FROM sync_state WHERE file = ?", (path,))
+    fingerprint = (table, info.st_size, info.st_mtime_ns)
+    if not delete_missing and cur.fetchone() == fingerprint:
+        stats["skipped"] = True
+        return stats
+
+    headers = read_csv_headers(file)
+    if not headers:
+        return stats
+    headers[0] = "part_num PRIMARY KEY"
+    create_table(
+        "CREATE TABLE IF NOT EXISTS " + table + "(" + ",".join(headers) + ");",
+        table,
+    )
+    create_row_hashes(conn, table)
+    close_connection(conn)
+
+    hashes = row_hash_table(table)
+    columns = return_column_names(table)
+    upsert = (
+        "INSERT INTO "
+        + table
+        + " VALUES ("
+        + ",".join("?" for column in columns)
+        + ") ON CONFLICT(part_num) DO UPDATE SET "
+        + ", ".join(column + " = excluded." + column for column in columns[1:])
+    )
+    seen = set()
+
+    for chunk in read_csv_chunks(file, chunk_size):
+        stats["read"] += len(chunk)
+        rows = {row[0]: row for row in chunk}
+        seen.update(rows)
+        part_nums = list(rows)
+        old_hashes = {}
+        existing = set()
+        for part_chunk in chunks(part_nums, MAX_VARIABLES):
+            marks = ",".join("?" for part_num in part_chunk)
+            cur.execute(
+                "SELECT part_num, hash FROM " + hashes + " WHERE part_num IN (" + marks + ")",
+                part_chunk,
+            )
+            old_hashes.update(cur.fetchall())
+            cur.execute(
+                "SELECT part_num FROM " + table + " WHERE part_num IN (" + marks + ")",
+                part_chunk,
+            )
+            existing.update(row[0] for row in cur.fetchall())
+
+        changed = []
+        new_hashes = []
+        for part_num, row in rows.items():
+            content = row_hash(row)
+            if old_hashes.get(part_num) == content:
+                stats["unchanged"] += 1
+                continue
+            if part_num in existing:
+                stats["updated"] += 1
+            else:
+                stats["inserted"] += 1
+            changed.append(row)
+            new_hashes.append((part_num, content))
+
+        cur.executemany(upsert, changed)
+        cur.executemany("REPLACE INTO " + hashes + " VALUES (?, ?)", new_hashes)
+        close_connection(conn)
+
+    if delete_missing:
+        cur.execute("SELECT part_num FROM " + table)
+        missing = [row[0] for row in cur.fetchall() if row[0] not in seen]
+        for part_chunk in chunks(missing, MAX_VARIABLES):
+            cur.execute(
+                "DELETE FROM "
                 + table
-                + " VALUES ("
-                + ",".join(columns)
+                + " WHERE part_num IN ("
+                + ",".join("?" for part_num in part_chunk)
                 + ")",
-                to_import,
+                part_chunk,
             )
+        stats["deleted"] = len(missing)
 
-            close_connection(conn)
-    else:
-        print("Error! Unable to connect to the database.")
+    cur.execute(
+        "REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+        (path, table, info.st_size, info.st_mtime_ns),
+    )
+    close_connection(conn)
+    table_changed(table)
+    return stats
 
 
 def csv_writer(file, rows):
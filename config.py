@@ -0,0 +1,81 @@
+"""Settings for the database location and SQLite3 connection tuning."""
+import os
+from configparser import ConfigParser
+from os.path import join as pathjoin
+
+
+CONFIG_FILE = "subhunt.ini"
+
+DEFAULT_DB_PATH = pathjoin("db", "parts.db")
+
+# PRAGMA name -> value applied to every new connection.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": "-20000",
+    "mmap_size": "268435456",
+    "temp_store": "MEMORY",
+}
+
+
+class Settings:
+    """
+    Database path and per-connection PRAGMA settings.
+
+    Values are resolved in order of precedence: arguments passed to
+    the constructor, the SUBHUNT_DB environment variable (database path
+    only), the [database] section of the config file and finally the
+    defaults above.  The config file is subhunt.ini in the working
+    directory unless SUBHUNT_CONFIG or config_file points elsewhere.
+
+    :param db_path: Path to the SQLite3 database file
+    :param config_file: Path to an ini file with a [database] section
+    :param pragmas: PRAGMA overrides, e.g. journal_mode="DELETE"
+    """
+
+    def __init__(self, db_path=None, config_file=None, **pragmas):
+        self.config_file = config_file or os.environ.get("SUBHUNT_CONFIG", CONFIG_FILE)
+        file_settings = self.read_config_file(self.config_file)
+
+        self.db_path = (
+            db_path
+            or os.environ.get("SUBHUNT_DB")
+            or file_settings.pop("db_path", None)
+            or DEFAULT_DB_PATH
+        )
+
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        for name, value in file_settings.items():
+            if name in DEFAULT_PRAGMAS:
+                self.pragmas[name] = value
+        for name, value in pragmas.items():
+            if name not in DEFAULT_PRAGMAS:
+                raise ValueError("Unknown connection setting: " + name)
+            self.pragmas[name] = str(value)
+
+    @staticmethod
+    def read_config_file(file):
+        """
+        Returns the [database] section of file as a dict.
+
+        :param file: Path to the ini file
+        :return: Dict of settings, empty if file does not exist
+        """
+        parser = ConfigParser()
+        if not parser.read(file) or not parser.has_section("database"):
+            return {}
+        return dict(parser.items("database"))
+
+    def apply(self, conn):
+        """
+        Runs the PRAGMA statements for these settings on conn.
+
+        :param conn: Connection object
+        """
+        cur = conn.cursor()
+        for name, value in self.pragmas.items():
+            if value == "":
+                continue
+            if not value.lstrip("-").isalnum():
+                raise ValueError("Invalid value for " + name + ": " + value)
+            cur.execute("PRAGMA " + name + " = " + value)
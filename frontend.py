@@ -1,28 +1,37 @@
 """Displays the GUI for SubHunt."""
 import tkinter as tk
-from csv import reader as csvreader
 from tkinter import ttk, messagebox, filedialog
 from tkinter.ttk import Treeview, Scrollbar
 from os.path import basename
 from openpyxl import load_workbook
-from threading import Thread
 from collections import OrderedDict
+from itertools import chain
 
-from auto_hunt import copy_file, purge_subbed, get_type, save_to_file, get_all_parts
+from auto_hunt import archive_path, run_hunt
+from tasks import TaskExecutor
 from backend import (
     remove_table,
-    return_table,
     return_column_names,
-    return_possible_values,
+    return_all_possible_values,
     part_in_db,
     add_part,
     remove_part,
-    convert_to_dict,
+    get_part,
     update_part,
     list_subs,
     is_valid_sub,
     import_from_csv,
-    filter_columns,
+    import_many,
+    import_summary,
+    facet_counts,
+    count_rows,
+    get_page,
+    iter_pages,
+    search_parts,
+    full_text_search,
+    FTS_LIMIT,
+    PAGE_SIZE,
+    sync_from_csv,
     csv_writer,
 )
 
@@ -33,6 +42,129 @@ def clear_widgets(frame):
         widget.destroy()
 
 
+def show_error(error):
+    """Shows an exception raised by a background task."""
+    messagebox.showerror("Error!", str(error))
+
+
+class TypeAhead:
+    """
+    Suggests part numbers from every table as the user types into an
+    entry.  Searches are only sent once typing pauses for DEBOUNCE_MS
+    and run on the controller's task executor, superseding any search
+    still running for the same entry.  Choosing a suggestion fills in
+    the entry and sets the part type.
+
+    :param entry: Entry to suggest part numbers for
+    :param controller: Main window with the task executor
+    :param type_var: StringVar holding "HDD", "MEM" or "CPU", or None
+    """
+
+    DEBOUNCE_MS = 150
+
+    def __init__(self, entry, controller, type_var=None):
+        self.entry = entry
+        self.controller = controller
+        self.type_var = type_var
+        self.matches = []
+        self.pending = None
+        self.popup = None
+        self.listbox = None
+
+        self.entry.bind("<KeyRelease>", self.handle_key, add="+")
+        self.entry.bind("<Down>", self.focus_list, add="+")
+        self.entry.bind("<Escape>", lambda event: self.hide(), add="+")
+        self.entry.bind(
+            "<FocusOut>",
+            lambda event: self.entry.after(200, self.hide_unfocused),
+            add="+",
+        )
+
+    def handle_key(self, event):
+        """Restarts the debounce timer whenever the text changes."""
+        if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"):
+            return
+        if self.pending is not None:
+            self.entry.after_cancel(self.pending)
+        self.pending = self.entry.after(self.DEBOUNCE_MS, self.search)
+
+    def search(self):
+        """Searches for the text in the entry in the background."""
+        self.pending = None
+        prefix = self.entry.get().strip()
+        if not prefix:
+            self.controller.tasks.cancel(self)
+            self.hide()
+            return
+        self.controller.tasks.submit(
+            search_parts, prefix, on_done=self.show, key=self
+        )
+
+    def show(self, matches):
+        """
+        Lists matches under the entry.
+
+        :param matches: List returned by search_parts
+        """
+        self.matches = matches
+        if not matches:
+            self.hide()
+            return
+        if self.popup is None:
+            self.popup = tk.Toplevel(self.entry)
+            self.popup.wm_overrideredirect(True)
+            self.listbox = tk.Listbox(self.popup, height=len(matches))
+            self.listbox.pack(expand=True, fill="both")
+            self.listbox.bind("<ButtonRelease-1>", self.choose)
+            self.listbox.bind("<Return>", self.choose)
+            self.listbox.bind("<Escape>", lambda event: self.hide())
+        self.popup.wm_geometry(
+            "+{}+{}".format(
+                self.entry.winfo_rootx(),
+                self.entry.winfo_rooty() + self.entry.winfo_height(),
+            )
+        )
+        self.listbox.delete(0, tk.END)
+        self.listbox.configure(height=len(matches))
+        for table, part_num, value in matches:
+            label = part_num + "  (" + table.upper()
+            if value != part_num:
+                label += " " + value
+            self.listbox.insert(tk.END, label + ")")
+
+    def focus_list(self, event):
+        """Moves the keyboard focus to the suggestions."""
+        if self.popup is not None:
+            self.listbox.focus_set()
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+
+    def choose(self, event):
+        """Fills in the entry with the chosen suggestion."""
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        table, part_num, value = self.matches[selection[0]]
+        self.entry.delete(0, tk.END)
+        self.entry.insert(0, part_num)
+        if self.type_var is not None:
+            self.type_var.set(table.upper())
+        self.hide()
+        self.entry.focus_set()
+
+    def hide_unfocused(self):
+        """Hides the suggestions unless the user moved into them."""
+        if self.listbox is None or self.entry.focus_get() is not self.listbox:
+            self.hide()
+
+    def hide(self):
+        """Removes the suggestions."""
+        if self.popup is not None:
+            self.popup.destroy()
+            self.popup = None
+            self.listbox = None
+
+
 class Main(tk.Tk):
     """Displays initial state of GUI."""
 
@@ -40,10 +172,16 @@ class Main(tk.Tk):
 
         tk.Tk.__init__(self, *args, **kwargs)
 
+        # Long jobs (import, sync, export and Auto Hunt) get their own
+        # worker so they never hold up the queries behind each page.
+        self.tasks = TaskExecutor(self)
+        self.jobs = TaskExecutor(self, workers=1)
+
         self.menu = tk.Menu(self)
 
         self.file_menu = tk.Menu(self.menu, tearoff=False)
         self.file_menu.add_command(label="Import", command=self.import_list)
+        self.file_menu.add_command(label="Sync", command=self.sync_lists)
         self.file_menu.add_command(
             label="Purge Records", command=lambda: self.show_frame("PurgePage")
         )
@@ -115,14 +253,84 @@ class Main(tk.Tk):
         frame = self.frames[page_name]
         frame.tkraise()
 
+    def destroy(self):
+        """Stops the background tasks before closing the window."""
+        self.tasks.shutdown()
+        self.jobs.shutdown()
+        tk.Tk.destroy(self)
+
     def import_list(self):
-        """Opens a dialog window to pick file for import"""
-        file = filedialog.askopenfilename(
+        """
+        Opens a dialog window to pick one or more files for import.
+        Several files are imported in parallel by import_many and a
+        summary is shown when they are done.
+        """
+        files = filedialog.askopenfilenames(
             title="Import", filetypes=[("CSV files", "*.csv")]
         )
 
-        if file != "":
-            import_from_csv(file)
+        if len(files) == 1:
+            self.jobs.submit(
+                import_from_csv,
+                files[0],
+                on_done=lambda stats: messagebox.showinfo(
+                    "Import Complete",
+                    "{}: {} read, {} inserted".format(
+                        basename(files[0]), stats["read"], stats["inserted"]
+                    ),
+                ),
+                on_error=show_error,
+            )
+        elif len(files) > 1:
+            self.jobs.submit(
+                import_many,
+                files,
+                on_done=lambda stats: messagebox.showinfo(
+                    "Import Complete", import_summary(stats)
+                ),
+                on_error=show_error,
+            )
+
+    def sync_lists(self):
+        """
+        Opens a dialog window to pick files to sync the database with,
+        updating changed parts rather than only adding new ones.
+        """
+        files = filedialog.askopenfilenames(
+            title="Sync", filetypes=[("CSV files", "*.csv")]
+        )
+        if not files:
+            return
+
+        delete_missing = messagebox.askyesno(
+            "Sync", "Remove parts that are not in the selected files?"
+        )
+
+        def sync_task():
+            """Syncs every file and returns a line of stats for each."""
+            lines = []
+            for file in files:
+                stats = sync_from_csv(file, delete_missing)
+                if stats["skipped"]:
+                    lines.append(basename(file) + ": unchanged since last sync")
+                else:
+                    lines.append(
+                        "{}: {} added, {} updated, {} removed".format(
+                            basename(file),
+                            stats["inserted"],
+                            stats["updated"],
+                            stats["deleted"],
+                        )
+                    )
+            return lines
+
+        self.jobs.submit(
+            sync_task,
+            on_done=lambda lines: messagebox.showinfo(
+                "Sync Complete", "\n".join(lines)
+            ),
+            on_error=show_error,
+        )
 
     def automate_sub_hunt(self):
         """
@@ -130,94 +338,67 @@ class Main(tk.Tk):
         completes the auto-hunt.
         """
 
-        def validate(row, all_parts):
-            repair_locs = ["1320", "622", "630", "68", "67",
-                            "69", "610", "615", "618", "624"]
-            brands = ("ACE", "ALI", "ASU", "DEL", "GWY", "HEW", "LNV",
-                      "MSS", "RCM", "RZR", "SAC", "SYC", "TSC",)
-
-            if row[0] not in repair_locs:
-                return False
-            if get_type(row[31], all_parts) is None:
-                return False
-            if row[21] not in brands:
-                return False
-            if row[14] is None:
-                return False
-            if row[15] != row[14]:
-                return False
-                
-            return True
-
-        def filter_data(data, all_parts):         
-            filtered = [
-                [row[31], get_type(row[31], all_parts), row[14], row[13]]
-                for row in data if validate(row, all_parts)
-            ]
-            
-            return filtered
-
-        def get_data():
+        def get_file():
             """
-            Opens a menu to select the openPO report text file.  
-            The file is then copied and the contents returned as a 
-            list of rows.
+            Opens a menu to select the openPO report text file and
+            returns its path.
             """
-            file = filedialog.askopenfilename(
+            return filedialog.askopenfilename(
                 title="Location of openPO",
                 initialdir=r"%USER%\Desktop",
                 filetypes=[("Plain Text", "*.txt"), ("CSV", "*.csv"),],
-            )            
-            
-            if file:
-                copied = copy_file(file)
-            
-            data = []
-            with open(file, "r") as csvfile:
-                reader = csvreader(csvfile, delimiter="\t")
-                for row in reader:
-                    data.append(row)
-            
-            return data
- 
-        def show_done():
+            )
+
+        def show_done(popup):
             """
-            Popup window informing the user that autohunt has finished.
+            Closes the progress bar window and informs the user that
+            autohunt has finished.
+
+            :param popup: Window displaying the progress bar
             """
-            popup = tk.Tk()
-            popup.wm_title("!")
-            label = ttk.Label(popup, text="DONE!", font=("Helvetica", 10))
-            label.pack(side="top", fill="x", pady=10)
-            B1 = ttk.Button(popup, text="Okay", command = popup.destroy)
-            B1.pack()
-            popup.mainloop()
- 
-        def hunter_task(popup, data):
+            popup.destroy()
+            messagebox.showinfo("!", "DONE!")
+
+        def show_failed(popup, error):
             """
-            Pulls the desired orders from the open orders report and
-            displays an indeterminate progress bar to let the user know
-            that the application is not frozen.  Once done the progress
-            bar window is destroyed, purge_subbed is called and the
-            data is saved to and Excel file.
+            Closes the progress bar window and shows why autohunt failed.
 
-            :param popup: Window to display the prograss bar in
+            :param popup: Window displaying the progress bar
+            :param error: Exception raised by run_hunt
             """
-            tk.Label(popup, text="Working...\n").grid(row=0, column=0)
-            progress_bar = ttk.Progressbar(popup, mode="indeterminate")
-            progress_bar.grid(row=1, column=0)
-            progress_bar.start(50)
-            popup.pack_slaves()
-            all_parts = get_all_parts()           
-            filtered = filter_data(data[1:], all_parts)           
-
-            save_to_file(purge_subbed(filtered))
             popup.destroy()
-            show_done()
+            show_error(error)
+
+        file = get_file()
+        if not file:
+            return
+
+        popup = tk.Toplevel(self)
+        status = tk.StringVar()
+        status.set("Working...")
+        tk.Label(popup, textvariable=status, width=60).grid(row=0, column=0)
+        progress_bar = ttk.Progressbar(
+            popup, mode="determinate", maximum=1.0, length=400
+        )
+        progress_bar.grid(row=1, column=0, padx=10, pady=10)
+
+        def show_progress(event):
+            """
+            Shows a HuntProgress event from run_hunt.
 
-        data = get_data()
-        popup = tk.Toplevel()
-        t = Thread(target=hunter_task, args=(popup,data))
-        t.start()
+            :param event: HuntProgress
+            """
+            status.set(str(event))
+            progress_bar["value"] = event.fraction or 0.0
+
+        self.jobs.submit(
+            run_hunt,
+            file,
+            archive=archive_path(),
+            progress=self.jobs.reporter(show_progress),
+            on_done=lambda result: show_done(popup),
+            on_error=lambda error: show_failed(popup, error),
+        )
 
 
 class MainPage(tk.Frame):
@@ -249,11 +430,19 @@ class PurgePage(tk.Frame):
         self.purge_button.grid(column=1, row=1, sticky="EW")
 
     def purge_table(self):
-        """Calls remove_table to remove table from the database."""
-        if remove_table(self.db_var.get().lower()):
-            messagebox.showinfo("Purge Complete", self.db_var.get() + " table purged.")
-        else:
-            messagebox.showerror("Error!")
+        """Calls remove_table in the background to purge the chosen table."""
+        table = self.db_var.get()
+
+        def show_purged(removed):
+            """Tells the user whether the table was purged."""
+            if removed:
+                messagebox.showinfo("Purge Complete", table + " table purged.")
+            else:
+                messagebox.showerror("Error!")
+
+        self.controller.tasks.submit(
+            remove_table, table.lower(), on_done=show_purged, on_error=show_error
+        )
 
 
 class AddPartPage(tk.Frame):
@@ -607,12 +796,23 @@ class AddPartPage(tk.Frame):
                 str(bool(self.subbed_var.get())).upper(),
             )
             self.table = "cpu"
-        if add_part(self.table, self.part_info) == "Done":
-            self.clear_fields()
-            messagebox.showinfo(
-                "Part Added",
-                self.part_num_box.get().strip() + " has been added to the database.",
-            )
+        part_num = self.part_info[0].strip()
+
+        def show_added(result):
+            """Clears the form and tells the user the part was added."""
+            if result == "Done":
+                self.clear_fields()
+                messagebox.showinfo(
+                    "Part Added", part_num + " has been added to the database."
+                )
+
+        self.controller.tasks.submit(
+            add_part,
+            self.table,
+            self.part_info,
+            on_done=show_added,
+            on_error=show_error,
+        )
 
     def change_dropdown(self, *args):
         """
@@ -662,22 +862,31 @@ class RemovePartPage(tk.Frame):
     def remove_it(self):
         """
         Retreives table and part_num field data and uses it
-        to call remove_part.
+        to call remove_part in the background.
         """
         self.part_num = self.part_num_box.get().strip()
         self.table = self.part_type_var.get()
-        if (
-            self.part_num != ""
-            and part_in_db(self.table, self.part_num)
-            and remove_part(self.table, self.part_num) == "Done"
-        ):
-            messagebox.showinfo("Part Removed", self.part_num + " removed successfuly.")
-        elif self.part_num == "":
+        if self.part_num == "":
             messagebox.showerror("Invalid Entry", "Please enter a part number.")
-        elif not part_in_db(self.table, self.part_num):
-            messagebox.showerror(
-                "Invalid Entry", self.part_num + " does not exist in the database."
-            )
+            return
+        part_num = self.part_num
+
+        def show_removed(result):
+            """Tells the user whether the part was removed."""
+            if result == "Done":
+                messagebox.showinfo("Part Removed", part_num + " removed successfuly.")
+            else:
+                messagebox.showerror(
+                    "Invalid Entry", part_num + " does not exist in the database."
+                )
+
+        self.controller.tasks.submit(
+            remove_part,
+            self.table,
+            part_num,
+            on_done=show_removed,
+            on_error=show_error,
+        )
 
 
 class EditPartPage(tk.Frame):
@@ -707,6 +916,9 @@ class EditPartPage(tk.Frame):
             self.container, self.info_type_var, *self.info_types
         )
         self.info_type_drop.grid(column=2, row=0, sticky="EW")
+        self.type_ahead = TypeAhead(
+            self.info_search_box, controller, self.info_type_var
+        )
 
         self.info_search_button = tk.Button(
             self.container,
@@ -731,23 +943,55 @@ class EditPartPage(tk.Frame):
         """
         
         self.part_info = tuple(value.get() for key, value in updated_info.items())
-        if update_part(self.info_type_var.get().lower(), self.part_info) == "Done":
-            messagebox.showinfo(
-                "Part Update", self.info_search_box.get().strip() + " has been updated."
-            )
+        part_num = self.info_search_box.get().strip()
+
+        def show_saved(result):
+            """Tells the user the part was saved."""
+            if result == "Done":
+                messagebox.showinfo("Part Update", part_num + " has been updated.")
+
+        self.controller.tasks.submit(
+            update_part,
+            self.info_type_var.get().lower(),
+            self.part_info,
+            on_done=show_saved,
+            on_error=show_error,
+        )
 
     def show_part_info(self, part_num):
         """
-        Displays the part info in the GUI in a visually appealing
-        way.  Will display an error message if the part passed to
-        it is not in the database.
+        Looks up part_num in the background, then calls show_part to
+        display it.  Will display an error message if no part number
+        was entered.
 
         :param part_num: Part number to be edited
         """
         clear_widgets(self.sub_frame)
         self.table = self.info_type_var.get().lower()
-        if part_num != "" and part_in_db(self.table, part_num):
-            self.part_info = convert_to_dict(self.table, part_num)
+        if part_num == "":
+            messagebox.showerror("Invalid Entry", "Please enter a part number.")
+            return
+
+        self.controller.tasks.submit(
+            get_part,
+            self.table,
+            part_num,
+            on_done=lambda part: self.show_part(part_num, part),
+            on_error=show_error,
+            key="edit_part",
+        )
+
+    def show_part(self, part_num, part):
+        """
+        Displays the part found by show_part_info in the GUI in a
+        visually appealing way.  Will display an error message if
+        the part is not in the database.
+
+        :param part_num: Part number searched for
+        :param part: Row for part_num or None
+        """
+        if part is not None:
+            self.part_info = OrderedDict(zip(part.keys(), part))
             for row_num, key in enumerate(self.part_info):
                 if key in ["do_not_sub", "subbed"]:
                     self.part_info[key] = str(self.part_info[key]).upper()
@@ -814,9 +1058,7 @@ class EditPartPage(tk.Frame):
                 tk.Label(self.sub_frame, text=key).grid(
                     column=0, row=row_num, sticky="W"
                 )
-        elif part_num == "":
-            messagebox.showerror("Invalid Entry", "Please enter a part number.")
-        elif not part_in_db(self.table, part_num):
+        else:
             messagebox.showerror(
                 "Invalid Entry", part_num + " does not exist in the database."
             )
@@ -853,6 +1095,9 @@ class SearchPage(tk.Frame):
             self.container, self.info_type_var, *self.info_types
         )
         self.info_type_drop.grid(column=2, row=0, sticky="EW")
+        self.type_ahead = TypeAhead(
+            self.info_search_box, controller, self.info_type_var
+        )
 
         self.info_search_button = tk.Button(
             self.container,
@@ -870,10 +1115,29 @@ class SearchPage(tk.Frame):
         """
         clear_widgets(self.sub_frame)
         self.table = self.info_type_var.get().lower()
-        if part_num != "" and part_in_db(self.table, part_num):
-            self.part_dict = convert_to_dict(self.table, part_num)
+        if part_num == "":
+            messagebox.showerror("Invalid Entry", "Please enter a part number.")
+            return
+
+        self.controller.tasks.submit(
+            get_part,
+            self.table,
+            part_num,
+            on_done=lambda part: self.show_part(part_num, part),
+            on_error=show_error,
+            key="part_info",
+        )
+
+    def show_part(self, part_num, part):
+        """
+        Displays the data found by show_part_info.
+
+        :param part_num: Part number searched for
+        :param part: Row for part_num or None
+        """
+        if part is not None:
             self.part_info = {
-                key: value for key, value in self.part_dict.items() if value != ""
+                key: part[key] for key in part.keys() if part[key] != ""
             }
             for row_num, key in enumerate(self.part_info):
                 if key in ["do_not_sub", "subbed"]:
@@ -884,9 +1148,7 @@ class SearchPage(tk.Frame):
                 tk.Label(self.sub_frame, text=self.part_info[key]).grid(
                     column=1, row=row_num, sticky="W"
                 )
-        elif part_num == "":
-            messagebox.showerror("Invalid Entry", "Please enter a part number.")
-        elif not part_in_db(self.table, part_num):
+        else:
             messagebox.showerror(
                 "Invalid Entry", part_num + " does not exist in the database."
             )
@@ -923,6 +1185,12 @@ class VerifySubsPage(tk.Frame):
             self.search_frame, self.subs_type_var, *self.subs_types
         )
         self.subs_type_drop.grid(column=0, row=2)
+        self.part_num_type_ahead = TypeAhead(
+            self.part_num_box, controller, self.subs_type_var
+        )
+        self.other_part_type_ahead = TypeAhead(
+            self.other_part_box, controller, self.subs_type_var
+        )
 
         self.subs_search_button = tk.Button(
             self.search_frame,
@@ -960,7 +1228,15 @@ class VerifySubsPage(tk.Frame):
         :param other_part_num: Part number to compare
         """
         if part_num and other_part_num:
-            self.show_result(is_valid_sub(table, part_num, other_part_num))
+            self.controller.tasks.submit(
+                is_valid_sub,
+                table,
+                part_num,
+                other_part_num,
+                on_done=self.show_result,
+                on_error=show_error,
+                key="verify_sub",
+            )
         else:
             messagebox.showerror(
                 "All fields required",
@@ -999,13 +1275,28 @@ class FindSubsPage(tk.Frame):
             self.search_frame, self.subs_type_var, *self.subs_types
         )
         self.subs_type_drop.grid(column=2, row=0)
+        self.type_ahead = TypeAhead(
+            self.subs_search_box, controller, self.subs_type_var
+        )
+
+        self.relaxed_var = tk.BooleanVar()
+        self.relaxed_var.set(False)
+        self.relaxed_check = tk.Checkbutton(
+            self.search_frame,
+            text="Allow Upgrades? ",
+            variable=self.relaxed_var,
+            offvalue=False,
+            onvalue=True,
+            anchor="w",
+        )
+        self.relaxed_check.grid(column=3, row=0)
 
         self.subs_search_button = tk.Button(
             self.search_frame,
             text="Search",
             command=lambda: self.find_subs(self.subs_search_box.get().strip()),
         )
-        self.subs_search_button.grid(column=3, row=0)
+        self.subs_search_button.grid(column=4, row=0)
 
     def make_table(self, table, subs):
         """
@@ -1095,23 +1386,56 @@ class FindSubsPage(tk.Frame):
         :param part_num: Part number to find subs for
         """
         self.table = self.subs_type_var.get().lower()
-        if part_num != "" and part_in_db(self.table, part_num):
-            subs = list_subs(self.table, part_num)
-            if subs:
-                self.make_table(self.table, subs)
-        elif not part_in_db(self.table, part_num):
+        relaxed = self.relaxed_var.get()
+
+        def subs_task(table):
+            """Returns the subs for part_num, None if it is not in table."""
+            if part_num != "" and part_in_db(table, part_num):
+                return list_subs(table, part_num, relaxed)
+            return None
+
+        self.controller.tasks.submit(
+            subs_task,
+            self.table,
+            on_done=lambda subs: self.show_subs(part_num, subs),
+            on_error=show_error,
+            key="find_subs",
+        )
+
+    def show_subs(self, part_num, subs):
+        """
+        Displays the subs found by find_subs.
+
+        :param part_num: Part number searched for
+        :param subs: List of subs or None if part_num is not in the database
+        """
+        if subs is None:
             messagebox.showerror(
                 "Invalid Entry", part_num + " does not exist in the database."
             )
+        elif subs:
+            self.make_table(self.table, subs)
 
 
 class BrowsePage(tk.Frame):
     """
     Displays treeview with all parts listed for a given table.
+
+    Parts are fetched a page at a time as the user scrolls and at most
+    WINDOW_PAGES pages are kept in the treeview, so large tables open
+    instantly and only a small window of rows is ever held in memory.
     """
 
+    WINDOW_PAGES = 3
+    SEARCH_DELAY_MS = 300
+
     def __init__(self, parent, controller):
         self.specs = []
+        self.filters = {}
+        self.var_dict = {}
+        self.option_menus = {}
+        self.loading = False
+        self.pending_search = None
         tk.Frame.__init__(self, parent)
         self.controller = controller
 
@@ -1135,19 +1459,25 @@ class BrowsePage(tk.Frame):
         )
         self.table_type_drop.grid(column=0, row=0)
 
+        self.search_var = tk.StringVar()
+        self.search_label = tk.Label(self.type_frame, text="Search: ")
+        self.search_label.grid(column=3, row=0)
+        self.search_box = tk.Entry(self.type_frame, textvariable=self.search_var)
+        self.search_box.grid(column=4, row=0)
+        self.search_box.bind("<KeyRelease>", self.handle_search_key)
+        self.search_box.bind("<Return>", lambda event: self.handle_filter_change())
+
         self.table_var.trace("w", self.handle_table_change)
         self.table_var.set("HDD")
 
     def fill_table(self, parts):
         """
-        Displays list of a parts from a table in a spreadsheet
-        like manner.
+        Displays the first page of parts matching the current filters
+        in a spreadsheet like manner.
 
-        :param parts: List of parts
-            of part_num
+        :param parts: First page of parts
         """
         clear_widgets(self.filter_frame)
-        self.results_tv.delete(*self.results_tv.get_children())
 
         self.headers = return_column_names(self.table_var.get())
         self.results_tv["columns"] = self.headers
@@ -1158,8 +1488,109 @@ class BrowsePage(tk.Frame):
 
         self.results_tv.column("#" + str(len(self.headers)), minwidth=0, width=0, stretch=False)
 
-        for part in parts:
-            self.results_tv.insert("", tk.END, text=part[0], values=part[1:])
+        self.reload_rows(parts)
+
+    def reload_rows(self, parts):
+        """
+        Replaces the rows in the treeview with the first page of parts
+        matching the current filters.
+
+        :param parts: First page of parts
+        """
+        self.results_tv.delete(*self.results_tv.get_children())
+        self.at_start = True
+        self.at_end = False
+        self.load_rows(parts)
+        self.results_tv.yview_moveto(0)
+
+    def load_rows(self, parts, at_end=True):
+        """
+        Adds a page of parts to one end of the treeview, dropping rows
+        from the other end once more than WINDOW_PAGES pages are shown.
+        The rows in view stay where they are.
+
+        :param parts: List of parts in part number order
+        :param at_end: Add after the last row, otherwise before the first
+        """
+        self.loading = False
+        if len(parts) < PAGE_SIZE:
+            if at_end:
+                self.at_end = True
+            else:
+                self.at_start = True
+
+        shown = len(self.results_tv.get_children())
+        top = round(self.results_tv.yview()[0] * shown)
+        if at_end:
+            for part in parts:
+                self.results_tv.insert(
+                    "", tk.END, iid=part[0], text=part[0], values=part[1:]
+                )
+        else:
+            top += len(parts)
+            for part in reversed(parts):
+                self.results_tv.insert("", 0, iid=part[0], text=part[0], values=part[1:])
+
+        children = self.results_tv.get_children()
+        excess = len(children) - self.WINDOW_PAGES * PAGE_SIZE
+        if excess > 0:
+            if at_end:
+                self.results_tv.delete(*children[:excess])
+                self.at_start = False
+                top -= excess
+            else:
+                self.results_tv.delete(*children[-excess:])
+                self.at_end = False
+            children = children[excess:] if at_end else children[:-excess]
+
+        if children and shown:
+            self.results_tv.yview_moveto(max(top, 0) / len(children))
+
+    def handle_scroll(self, first, last):
+        """
+        Moves the scrollbar and fetches the next or previous page of
+        parts in the background when the view gets close to either end
+        of the rows shown.
+
+        :param first: Fraction of the rows above the view
+        :param last: Fraction of the rows up to the bottom of the view
+        """
+        self.vsb.set(first, last)
+        children = self.results_tv.get_children()
+        if self.loading or not children:
+            return
+        if float(last) > 0.9 and not self.at_end:
+            self.loading = True
+            self.controller.tasks.submit(
+                get_page,
+                self.table_var.get(),
+                self.filters,
+                after=children[-1],
+                on_done=self.load_rows,
+                on_error=self.show_failed,
+                key="browse",
+            )
+        elif float(first) < 0.1 and not self.at_start:
+            self.loading = True
+            self.controller.tasks.submit(
+                get_page,
+                self.table_var.get(),
+                self.filters,
+                before=children[0],
+                on_done=lambda parts: self.load_rows(parts, at_end=False),
+                on_error=self.show_failed,
+                key="browse",
+            )
+
+    def show_failed(self, error):
+        """
+        Shows why a background query failed and lets scrolling fetch
+        pages again.
+
+        :param error: Exception raised by the query
+        """
+        self.loading = False
+        show_error(error)
 
     def OnDoubleClick(self, event):
         item = self.results_tv.selection()[0]
@@ -1167,70 +1598,193 @@ class BrowsePage(tk.Frame):
 
     def build_treeview(self):
         clear_widgets(self.results_frame)
-        self.results_tv = Treeview(self.results_frame, columns=1, height=20)
+        self.results_tv = Treeview(
+            self.results_frame,
+            columns=1,
+            height=20,
+            yscrollcommand=lambda first, last: self.after_idle(
+                self.handle_scroll, first, last
+            ),
+        )
         self.results_tv.pack(expand=True, fill="both")
         self.result_label = tk.Label(self.results_frame, textvariable=self.result_count)
         self.result_label.pack(side="bottom")
-        vsb = Scrollbar(
+        self.vsb = Scrollbar(
             self.results_tv, orient="vertical", command=self.results_tv.yview
         )
-        vsb.place(x=1, y=25, height=400)
+        self.vsb.place(x=1, y=25, height=400)
         self.results_tv.bind("<Double-1>", self.OnDoubleClick)
 
-    def make_buttons(self, table):
+    def make_buttons(self, possible_values):
         """
         Make buttons for filtering data
 
-        :param table:  Table in sqlite3 db
+        :param possible_values: Dict of column -> values to offer
         """
         self.var_dict = {}
-        columns = return_column_names(table)
-        for column_name in enumerate(columns):
+        self.option_menus = {}
+        for column_name in enumerate(possible_values):
             self.var_dict[column_name[1]] = tk.StringVar()
             self.var_dict[column_name[1]].set(column_name[1])
             _ = tk.OptionMenu(
                 self.filter_frame,
                 self.var_dict[column_name[1]],
-                *return_possible_values(table, column_name[1])
+                *possible_values[column_name[1]]
             )
             _.configure(width=len(column_name[1]))
             _.grid(column=column_name[0], row=0, sticky="EW")
+            self.option_menus[column_name[1]] = _
             self.var_dict[column_name[1]].trace("w", self.handle_filter_change)
         tk.Button(self.type_frame, text="Export", command=self.save_to_file).grid(
             column=2, row=0
         )
 
     def save_to_file(self):
-        rows = [self.headers]
-        for child in self.results_tv.get_children():
-            _templst = self.results_tv.item(child)["values"]
-            _templst.insert(0, self.results_tv.item(child)["text"])
-            rows.append(_templst)
-        csv_writer("exported_list.csv", rows)
+        table = self.table_var.get()
+        headers = self.headers
+        filters = self.filters
+        text = self.search_var.get()
+
+        def export():
+            """Writes every part matching the filters and search."""
+            if text.strip():
+                rows = full_text_search(table, text, filters, None)
+            else:
+                rows = iter_pages(table, filters)
+            csv_writer("exported_list.csv", chain([headers], rows))
+
+        self.controller.jobs.submit(export, on_error=show_error)
+
+    def update_facets(self, counts):
+        """
+        Refills the filter dropdowns with the values that still match
+        the other filters, labelled with how many parts each would
+        return.
+
+        :param counts: Dict returned by facet_counts
+        """
+        for column, option_menu in self.option_menus.items():
+            menu = option_menu["menu"]
+            menu.delete(0, tk.END)
+            for value, count in counts[column]:
+                menu.add_command(
+                    label=value + " (" + str(count) + ")",
+                    command=tk._setit(self.var_dict[column], value),
+                )
+
+    @staticmethod
+    def query_filters(table, multi_filter, text):
+        """
+        Runs the queries for a filter change.  Called on a worker thread.
+
+        :param table:  Table in sqlite3 db
+        :param multi_filter: Dictionary of columns and chosen values
+        :param text: Words to search the descriptions for, may be blank
+        :return: (first page of parts or the best search matches,
+            number of parts, facet counts, whether text was searched)
+        """
+        if text.strip():
+            parts = full_text_search(table, text, multi_filter)
+            count = len(parts)
+        else:
+            parts = get_page(table, multi_filter)
+            count = count_rows(table, multi_filter)
+        return (
+            parts,
+            count,
+            facet_counts(table, multi_filter, text),
+            bool(text.strip()),
+        )
+
+    def show_filtered(self, results):
+        """
+        Displays the results of query_filters.  Search matches are
+        ranked rather than in part number order, so they are shown all
+        at once instead of being paged.
+
+        :param results: Tuple returned by query_filters
+        """
+        parts, count, counts, searched = results
+        self.reload_rows(parts)
+        if searched:
+            self.at_end = True
+            self.result_count.set(
+                str(count) + ("+" if count >= FTS_LIMIT else "")
+            )
+        else:
+            self.result_count.set(str(count))
+        self.update_facets(counts)
+
+        tk.Button(
+            self.type_frame, text="Clear Filters", command=self.handle_reset
+        ).grid(column=1, row=0)
 
     def handle_filter_change(self, *args):
         multi_filter = {}
         for k, v in self.var_dict.items():
             if k != v.get():
                 multi_filter[k] = v.get()
-        parts = filter_columns(self.table_var.get(), multi_filter)
-        self.results_tv.delete(*self.results_tv.get_children())
-        for part in parts:
-            self.results_tv.insert("", tk.END, text=part[0], values=part[1:])
+        self.filters = multi_filter
+        self.loading = True
+        self.controller.tasks.submit(
+            self.query_filters,
+            self.table_var.get(),
+            multi_filter,
+            self.search_var.get(),
+            on_done=self.show_filtered,
+            on_error=self.show_failed,
+            key="browse",
+        )
 
-        self.result_count.set(str(len(parts)))
+    @staticmethod
+    def query_table(table):
+        """
+        Runs the queries for opening table.  Called on a worker thread.
 
-        tk.Button(
-            self.type_frame, text="Clear Filters", command=self.handle_reset
-        ).grid(column=1, row=0)
+        :param table:  Table in sqlite3 db
+        :return: (first page of parts, number of parts, possible values)
+        """
+        if not return_column_names(table):
+            return [], 0, {}
+        return get_page(table), count_rows(table), return_all_possible_values(table)
 
-    def handle_table_change(self, *args):
-        parts = return_table(self.table_var.get())
-        self.result_count.set(str(len(parts)))
+    def show_table(self, results):
+        """
+        Displays the results of query_table.
+
+        :param results: (first page of parts, number of parts, possible values)
+        """
+        parts, count, possible_values = results
+        self.result_count.set(str(count))
         self.build_treeview()
         self.fill_table(parts)
-        self.make_buttons(self.table_var.get())
+        self.make_buttons(possible_values)
+
+    def handle_search_key(self, event):
+        """Searches once the user stops typing for SEARCH_DELAY_MS."""
+        if event.keysym == "Return":
+            return
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(self.SEARCH_DELAY_MS, self.search)
+
+    def search(self):
+        """Shows the parts matching the search box and filters."""
+        self.pending_search = None
+        self.handle_filter_change()
+
+    def handle_table_change(self, *args):
+        self.filters = {}
+        self.search_var.set("")
+        self.loading = True
+        self.controller.tasks.submit(
+            self.query_table,
+            self.table_var.get(),
+            on_done=self.show_table,
+            on_error=self.show_failed,
+            key="browse",
+        )
 
     def handle_reset(self):
         clear_widgets(self.filter_frame)
-        self.handle_table_change()
\ No newline at end of file
+        self.handle_table_change()
@@ -0,0 +1,746 @@
+"""
+Versioned schema changes for the SQLite3 database.
+
+The schema version is stored in the database with PRAGMA user_version.
+migrate() applies every migration newer than that version in order and
+is run by backend.create_connection the first time it opens a database.
+"""
+from parts import (
+    GIB,
+    memory_generation,
+    parse_capacity,
+    parse_height,
+    parse_rpm,
+    parse_transfer_rate,
+)
+
+
+# Table prefix -> {index suffix: indexed columns}.  Sub matching joins
+# the sub group side tables instead, so only the flags index is left;
+# it serves Browse filters on do_not_sub and subbed.
+INDEXES = {
+    "hdd": {"flags": ("do_not_sub", "subbed")},
+    "mem": {"flags": ("do_not_sub", "subbed")},
+    "cpu": {"flags": ("do_not_sub", "subbed")},
+}
+
+# Table prefix -> columns the indexes and side tables of a parts table
+# are built from.  Tables named like parts tables that lack any of them,
+# e.g. one imported from cpu_notes.csv, are left as they are.
+REQUIRED_COLUMNS = {
+    "hdd": (
+        "type",
+        "physical_size",
+        "connector",
+        "hdd_capacity",
+        "ssd_capacity",
+        "speed",
+        "height",
+        "interface",
+        "do_not_sub",
+        "subbed",
+    ),
+    "mem": ("connector", "capacity", "speed", "do_not_sub", "subbed"),
+    "cpu": ("oem_part_num", "do_not_sub", "subbed"),
+}
+
+
+# Table prefix -> columns searched by prefix as the user types.  Each
+# gets a case-insensitive index so backend.search_parts is a range scan.
+SEARCH_COLUMNS = {
+    "hdd": ("part_num",),
+    "mem": ("part_num",),
+    "cpu": ("part_num", "oem_part_num"),
+}
+
+
+# Table prefix -> columns indexed for full text search, in the order
+# given to the FTS5 table.
+FTS_COLUMNS = {
+    "hdd": ("description", "brand"),
+    "mem": ("description", "brand"),
+    "cpu": ("description", "brand", "oem_part_num"),
+}
+
+
+# Table prefix -> columns that must be equal for two parts to be subs.
+# brand and height are not part of the key because list_subs accepts
+# the house brand and blank heights.  m.2 drives match on interface
+# (case-insensitively, like the LIKE in list_subs) instead of HDD
+# capacity and speed.
+SUB_GROUP_COLUMNS = {
+    "hdd": ("type", "physical_size", "connector", "hdd_capacity", "ssd_capacity", "speed"),
+    "m.2": ("type", "physical_size", "connector", "ssd_capacity", "interface"),
+    "mem": ("connector", "capacity", "speed"),
+    "cpu": ("oem_part_num",),
+}
+
+
+# Table prefix -> {specs column: function normalising it from a row of
+# the parts table}.  Specs are parsed in Python by refresh_specs rather
+# than by SQL functions in the triggers, so any SQLite client can still
+# write to the parts tables.
+SPEC_COLUMNS = {
+    "hdd": {
+        "hdd_bytes": lambda row: parse_capacity(row["hdd_capacity"]),
+        "ssd_bytes": lambda row: parse_capacity(row["ssd_capacity"]),
+        "rpm": lambda row: parse_rpm(row["speed"]),
+        "height_mm": lambda row: parse_height(row["height"]),
+    },
+    "mem": {
+        "capacity_bytes": lambda row: parse_capacity(row["capacity"], GIB),
+        "mts": lambda row: parse_transfer_rate(row["speed"]),
+    },
+}
+
+
+def join_key(*values):
+    """Joins values into a key, None if any of them is missing."""
+    if any(value is None for value in values):
+        return None
+    return "|".join(values)
+
+
+def hdd_relaxed_key(row):
+    """
+    Returns the columns of a drive that must still match exactly when
+    relaxed matching lets capacity and speed vary.
+    """
+    if row["connector"] == "m.2":
+        interface = row["interface"]
+        return join_key(
+            row["type"], row["physical_size"], "m.2", interface and interface.lower()
+        )
+    return join_key(row["type"], row["physical_size"], row["connector"])
+
+
+def mem_relaxed_key(row):
+    """
+    Returns the connector and generation a memory module must share with
+    its relaxed subs, or None if the generation is unknown (e.g. a plain
+    "2400" speed) so DDR3 and DDR4 modules are never mixed.
+    """
+    generation = memory_generation(row["speed"])
+    if not generation:
+        return None
+    return join_key(row["connector"], generation)
+
+
+# Table prefix -> function returning the relaxed matching key of a row.
+# Parts whose key is None take no part in relaxed matching.
+RELAXED_KEYS = {"hdd": hdd_relaxed_key, "mem": mem_relaxed_key}
+
+
+def list_tables(conn):
+    """
+    Returns the names of the parts tables in the database, leaving out
+    tables that lack the REQUIRED_COLUMNS.
+
+    :param conn: Connection object
+    :return: List of table names
+    """
+    return [table for table in named_tables(conn) if not missing_columns(conn, table)]
+
+
+def named_tables(conn):
+    """
+    Returns the names of the tables named like parts tables, whether or
+    not they have the REQUIRED_COLUMNS.
+
+    :param conn: Connection object
+    :return: List of table names
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return [
+        row[0]
+        for row in cur.fetchall()
+        if any(row[0].lower().startswith(prefix) for prefix in INDEXES)
+    ]
+
+
+def missing_columns(conn, table):
+    """
+    Returns the REQUIRED_COLUMNS for the part type of table that it
+    lacks.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    :return: List of column names, empty if none are missing
+    """
+    prefix = next((p for p in REQUIRED_COLUMNS if table.lower().startswith(p)), None)
+    if prefix is None:
+        return []
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(" + table + ")")}
+    return [column for column in REQUIRED_COLUMNS[prefix] if column not in existing]
+
+
+def report_skipped(table, missing):
+    """Prints that table is left without indexes and side tables."""
+    print(table + ": skipped, missing columns " + ", ".join(missing))
+
+
+def sub_group_table(table):
+    """
+    Returns the name of the side table holding sub group keys for table.
+
+    :param table: Name of database table
+    """
+    return "sub_groups_" + table.lower()
+
+
+def sub_group_expression(table, row="NEW"):
+    """
+    Returns the SQL expression computing the sub group key of a row in
+    table.  Two parts are subs only if their keys are equal.
+
+    :param table: Name of database table
+    :param row: Alias or trigger row (NEW/OLD) the columns belong to
+    :return: SQL expression as string, or None for unknown tables
+    """
+
+    def concat(columns):
+        values = []
+        for column in columns:
+            if column == "interface":
+                values.append("lower(" + row + ".interface)")
+            else:
+                values.append(row + "." + column)
+        return " || '|' || ".join(values)
+
+    if table.lower().startswith("hdd"):
+        return (
+            "CASE WHEN "
+            + row
+            + ".connector = 'm.2' THEN "
+            + concat(SUB_GROUP_COLUMNS["m.2"])
+            + " ELSE "
+            + concat(SUB_GROUP_COLUMNS["hdd"])
+            + " END"
+        )
+    for prefix in ("mem", "cpu"):
+        if table.lower().startswith(prefix):
+            return concat(SUB_GROUP_COLUMNS[prefix])
+    return None
+
+
+def create_sub_groups(conn, table):
+    """
+    Creates the sub group side table for table, fills it, and adds
+    triggers that keep it in step with every insert, update and delete.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    expression = sub_group_expression(table)
+    if expression is None:
+        return
+    groups = sub_group_table(table)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS "
+        + groups
+        + "(part_num TEXT PRIMARY KEY, group_key TEXT) WITHOUT ROWID"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS "
+        + groups
+        + "_key_idx ON "
+        + groups
+        + "(group_key)"
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO "
+        + groups
+        + " SELECT part_num, "
+        + sub_group_expression(table, table)
+        + " FROM "
+        + table
+    )
+    upsert = (
+        "INSERT OR REPLACE INTO "
+        + groups
+        + " VALUES (NEW.part_num, "
+        + expression
+        + ");"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + groups
+        + "_insert AFTER INSERT ON "
+        + table
+        + " BEGIN "
+        + upsert
+        + " END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + groups
+        + "_update AFTER UPDATE ON "
+        + table
+        + " BEGIN DELETE FROM "
+        + groups
+        + " WHERE part_num = OLD.part_num; "
+        + upsert
+        + " END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + groups
+        + "_delete AFTER DELETE ON "
+        + table
+        + " BEGIN DELETE FROM "
+        + groups
+        + " WHERE part_num = OLD.part_num; END"
+    )
+
+
+def row_hash_table(table):
+    """
+    Returns the name of the side table holding the content hash of each
+    row of table as of its last sync.
+
+    :param table: Name of database table
+    """
+    return "row_hashes_" + table.lower()
+
+
+def create_row_hashes(conn, table):
+    """
+    Creates the row hash side table for table.  Triggers drop a part's
+    hash whenever the part is written or removed (REPLACE INTO only
+    fires the insert trigger), so parts edited outside of a sync are
+    compared against the source again next time.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    hashes = row_hash_table(table)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS "
+        + hashes
+        + "(part_num TEXT PRIMARY KEY, hash TEXT) WITHOUT ROWID"
+    )
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "OLD"), ("DELETE", "OLD")):
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS "
+            + hashes
+            + "_"
+            + event.lower()
+            + " AFTER "
+            + event
+            + " ON "
+            + table
+            + " BEGIN DELETE FROM "
+            + hashes
+            + " WHERE part_num = "
+            + row
+            + ".part_num; END"
+        )
+
+
+def specs_table(table):
+    """
+    Returns the name of the side table holding normalised numeric specs
+    for table.
+
+    :param table: Name of database table
+    """
+    return "specs_" + table.lower()
+
+
+def specs_prefix(table):
+    """Returns the SPEC_COLUMNS prefix of table, or None if it has no specs."""
+    return next((p for p in SPEC_COLUMNS if table.lower().startswith(p)), None)
+
+
+def create_specs(conn, table):
+    """
+    Creates the specs side table for table with canonical numeric
+    columns (bytes, RPM, MT/s, mm) and the relaxed matching key, fills
+    it, and adds triggers keeping it in step with table.  The triggers
+    only mark written parts stale; refresh_specs parses them.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    prefix = specs_prefix(table)
+    if prefix is None:
+        return
+    specs = specs_table(table)
+    columns = SPEC_COLUMNS[prefix]
+
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS "
+        + specs
+        + "(part_num TEXT PRIMARY KEY, stale INTEGER, relaxed_key TEXT, "
+        + ", ".join(columns)
+        + ") WITHOUT ROWID"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS "
+        + specs
+        + "_relaxed_idx ON "
+        + specs
+        + "(relaxed_key, "
+        + ", ".join(columns)
+        + ")"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS "
+        + specs
+        + "_stale_idx ON "
+        + specs
+        + "(part_num) WHERE stale = 1"
+    )
+    mark_stale = (
+        "INSERT OR REPLACE INTO "
+        + specs
+        + "(part_num, stale) VALUES (NEW.part_num, 1);"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO "
+        + specs
+        + "(part_num, stale) SELECT part_num, 1 FROM "
+        + table
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + specs
+        + "_insert AFTER INSERT ON "
+        + table
+        + " BEGIN "
+        + mark_stale
+        + " END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + specs
+        + "_update AFTER UPDATE ON "
+        + table
+        + " BEGIN DELETE FROM "
+        + specs
+        + " WHERE part_num = OLD.part_num; "
+        + mark_stale
+        + " END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + specs
+        + "_delete AFTER DELETE ON "
+        + table
+        + " BEGIN DELETE FROM "
+        + specs
+        + " WHERE part_num = OLD.part_num; END"
+    )
+    refresh_specs(conn, table)
+
+
+def refresh_specs(conn, table):
+    """
+    Parses the specs of every part of table marked stale since the last
+    refresh.  Callers hold the write lock so a part written meanwhile by
+    another connection is not overwritten with older values.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    :return: Number of parts refreshed
+    """
+    prefix = specs_prefix(table)
+    if prefix is None:
+        return 0
+    specs = specs_table(table)
+    columns = SPEC_COLUMNS[prefix]
+    cur = conn.execute(
+        "SELECT t.* FROM "
+        + specs
+        + " AS s JOIN "
+        + table
+        + " AS t ON t.part_num = s.part_num WHERE s.stale = 1"
+    )
+    names = [column[0] for column in cur.description]
+    rows = [dict(zip(names, row)) for row in cur.fetchall()]
+    conn.executemany(
+        "INSERT OR REPLACE INTO "
+        + specs
+        + " VALUES (?, 0, ?, "
+        + ", ".join("?" for column in columns)
+        + ")",
+        (
+            [row["part_num"], RELAXED_KEYS[prefix](row)]
+            + [parse(row) for parse in columns.values()]
+            for row in rows
+        ),
+    )
+    return len(rows)
+
+
+def has_stale_specs(conn, table):
+    """
+    Checks if any part of table needs refresh_specs.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    :return: True or False
+    """
+    if specs_prefix(table) is None:
+        return False
+    cur = conn.execute(
+        "SELECT 1 FROM " + specs_table(table) + " WHERE stale = 1 LIMIT 1"
+    )
+    return cur.fetchone() is not None
+
+
+def fts_table(table):
+    """
+    Returns the name of the FTS5 index over the descriptions of table.
+
+    :param table: Name of database table
+    """
+    return "fts_" + table.lower()
+
+
+def create_fts(conn, table):
+    """
+    Creates the FTS5 index over the FTS_COLUMNS of table, fills it,
+    and adds triggers keeping it in step with table.  The index stores
+    no copy of the text; it reads rows from table by rowid.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    prefix = next((p for p in FTS_COLUMNS if table.lower().startswith(p)), None)
+    if prefix is None:
+        return
+    fts = fts_table(table)
+    existing = [row[1] for row in conn.execute("PRAGMA table_info(" + table + ")")]
+    columns = [column for column in FTS_COLUMNS[prefix] if column in existing]
+    if not columns:
+        return
+
+    def values(row):
+        return ", ".join(row + column for column in columns)
+
+    created = not conn.execute(
+        "SELECT count(*) FROM sqlite_master WHERE name = ?", (fts,)
+    ).fetchone()[0]
+    conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS "
+        + fts
+        + " USING fts5("
+        + ", ".join(columns)
+        + ", content='"
+        + table
+        + "', content_rowid='rowid')"
+    )
+    if created:
+        conn.execute("INSERT INTO " + fts + "(" + fts + ") VALUES ('rebuild')")
+    insert = (
+        "INSERT INTO "
+        + fts
+        + "(rowid, "
+        + ", ".join(columns)
+        + ") VALUES (NEW.rowid, "
+        + values("NEW.")
+        + ");"
+    )
+    delete = (
+        "INSERT INTO "
+        + fts
+        + "("
+        + fts
+        + ", rowid, "
+        + ", ".join(columns)
+        + ") VALUES ('delete', OLD.rowid, "
+        + values("OLD.")
+        + ");"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + fts
+        + "_insert AFTER INSERT ON "
+        + table
+        + " BEGIN "
+        + insert
+        + " END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + fts
+        + "_update AFTER UPDATE ON "
+        + table
+        + " BEGIN "
+        + delete
+        + " "
+        + insert
+        + " END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS "
+        + fts
+        + "_delete AFTER DELETE ON "
+        + table
+        + " BEGIN "
+        + delete
+        + " END"
+    )
+
+
+def prepare_table(conn, table):
+    """
+    Creates everything a parts table needs beyond its own columns:
+    indexes, the sub group and specs side tables and the full text
+    search index.  Tables missing REQUIRED_COLUMNS are skipped.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    missing = missing_columns(conn, table)
+    if missing:
+        report_skipped(table, missing)
+        return
+    create_indexes(conn, table)
+    create_search_indexes(conn, table)
+    create_sub_groups(conn, table)
+    create_specs(conn, table)
+    create_fts(conn, table)
+
+
+def create_indexes(conn, table):
+    """
+    Creates the sub-matching indexes for table if they do not exist.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    for prefix, indexes in INDEXES.items():
+        if not table.lower().startswith(prefix):
+            continue
+        for suffix, columns in indexes.items():
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS "
+                + table
+                + "_"
+                + suffix
+                + "_idx ON "
+                + table
+                + "("
+                + ",".join(columns)
+                + ")"
+            )
+
+
+def search_index(table, column):
+    """Returns the name of the case-insensitive index on table.column."""
+    return table + "_" + column + "_nocase_idx"
+
+
+def create_search_indexes(conn, table):
+    """
+    Creates the case-insensitive prefix search indexes for table if
+    they do not exist.
+
+    :param conn: Connection object
+    :param table: Name of database table
+    """
+    for prefix, columns in SEARCH_COLUMNS.items():
+        if not table.lower().startswith(prefix):
+            continue
+        for column in columns:
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS "
+                + search_index(table, column)
+                + " ON "
+                + table
+                + "("
+                + column
+                + " COLLATE NOCASE)"
+            )
+
+
+def add_sub_indexes(conn):
+    """Version 1: index the do_not_sub and subbed flags."""
+    for table in list_tables(conn):
+        create_indexes(conn, table)
+
+
+def add_sub_groups(conn):
+    """Version 2: precompute a sub group key for every part."""
+    for table in list_tables(conn):
+        create_sub_groups(conn, table)
+
+
+def add_sync_state(conn):
+    """Version 3: remember the fingerprint of each file last synced."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sync_state("
+        "file TEXT PRIMARY KEY, table_name TEXT, size INTEGER, mtime_ns INTEGER)"
+    )
+
+
+def add_specs(conn):
+    """Version 4: store normalised numeric specs for relaxed matching."""
+    for table in list_tables(conn):
+        create_specs(conn, table)
+
+
+def add_search_indexes(conn):
+    """Version 5: index part numbers for search as you type."""
+    for table in list_tables(conn):
+        create_search_indexes(conn, table)
+
+
+def add_fts(conn):
+    """Version 6: index descriptions for full text search."""
+    for table in list_tables(conn):
+        create_fts(conn, table)
+
+
+MIGRATIONS = [
+    add_sub_indexes,
+    add_sub_groups,
+    add_sync_state,
+    add_specs,
+    add_search_indexes,
+    add_fts,
+]
+
+
+def schema_version(conn):
+    """
+    Returns the schema version recorded in the database.
+
+    :param conn: Connection object
+    :return: Version number as int
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Applies any migrations newer than the database's schema version,
+    each in its own transaction.  The version is read again after the
+    write lock is taken, so a migration another connection has applied
+    in the meantime is skipped, and a migration that fails is rolled
+    back without bumping the version.
+
+    :param conn: Connection object
+    :raises sqlite3.Error: If a migration fails
+    :return: Schema version after migrating
+    """
+    version = schema_version(conn)
+    if version < len(MIGRATIONS):
+        for table in named_tables(conn):
+            missing = missing_columns(conn, table)
+            if missing:
+                report_skipped(table, missing)
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            version = schema_version(conn)
+            if number > version:
+                migration(conn)
+                conn.execute("PRAGMA user_version = " + str(number))
+                version = number
+    return version
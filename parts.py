@@ -0,0 +1,240 @@
+"""Typed records for the parts stored in the database."""
+import re
+
+
+GB = 10 ** 9
+GIB = 2 ** 30
+
+_CAPACITY = re.compile(r"^\s*([\d.]+)\s*(MB|GB|TB)?\s*$", re.IGNORECASE)
+_PC_RATING = re.compile(r"^\s*PC\d?L?-(\d+)", re.IGNORECASE)
+_NUMBER = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def parse_capacity(text, unit=GB):
+    """
+    Converts a capacity such as "500", "8GB" or "1TB" to bytes.  Bare
+    numbers are taken to be in GB.
+
+    :param text: Capacity as stored in the database
+    :param unit: Bytes in a GB, GB for drives and GIB for memory
+    :return: Number of bytes as int, or None if text is blank or unknown
+    """
+    match = _CAPACITY.match(text or "")
+    if match is None:
+        return None
+    kilo = 1000 if unit == GB else 1024
+    scale = {"MB": unit / kilo, "GB": unit, "TB": unit * kilo}
+    return int(float(match.group(1)) * scale[(match.group(2) or "GB").upper()])
+
+
+def parse_rpm(text):
+    """
+    Converts a drive speed such as "5400" to revolutions per minute.
+
+    :param text: Speed as stored in the database
+    :return: RPM as int, or None
+    """
+    match = _NUMBER.search(text or "")
+    if match is None:
+        return None
+    return int(float(match.group(1)))
+
+
+def parse_transfer_rate(text):
+    """
+    Converts a memory speed to megatransfers per second.  Module ratings
+    such as "PC4-19200S" (MB/s) are divided by the 8 byte bus width;
+    plain numbers such as "2400" are taken as MT/s already.
+
+    :param text: Speed as stored in the database
+    :return: MT/s as int, or None
+    """
+    match = _PC_RATING.match(text or "")
+    if match is not None:
+        return int(match.group(1)) // 8
+    return parse_rpm(text)
+
+
+def parse_height(text):
+    """
+    Converts a drive height such as "7" or "9.5" to millimetres.
+
+    :param text: Height as stored in the database
+    :return: Height as float, or None
+    """
+    match = _NUMBER.search(text or "")
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+def memory_generation(text):
+    """
+    Returns the module generation of a memory speed rating, e.g. "PC4"
+    for "PC4-19200S" or "PC3L" for "PC3L-12800S".  Modules of different
+    generations never fit the same slot.
+
+    :param text: Speed as stored in the database
+    :return: Generation as upper case string, "" if unknown
+    """
+    match = re.match(r"^\s*(PC\d?L?)-", text or "", re.IGNORECASE)
+    if match is None:
+        return ""
+    return match.group(1).upper()
+
+
+def parse_flag(text):
+    """Converts a "TRUE"/"FALSE" column to a bool."""
+    return str(text).upper() == "TRUE"
+
+
+class Part:
+    """
+    Base class for part records.  Subclasses list their columns in
+    FIELDS along with the function used to parse each one; columns
+    without a parser are kept as text.  SPECS maps the fields that are
+    parsed when a part is written to the specs side table column
+    holding the parsed value.
+    """
+
+    __slots__ = ()
+
+    FIELDS = {}
+
+    SPECS = {}
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            value = values.get(name)
+            parser = self.FIELDS.get(name)
+            if parser is not None:
+                value = parser(value)
+            setattr(self, name, value)
+
+    @classmethod
+    def from_specs(cls, values):
+        """
+        Builds a record from a row whose SPECS fields were read from the
+        specs side table, so only the remaining fields are parsed.
+
+        :param values: Dict of column name -> value
+        :return: Record
+        """
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            value = values.get(name)
+            parser = cls.FIELDS.get(name)
+            if parser is not None and name not in cls.SPECS:
+                value = parser(value)
+            setattr(record, name, value)
+        return record
+
+    def __repr__(self):
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join(
+                "{}={!r}".format(name, getattr(self, name)) for name in self.__slots__
+            ),
+        )
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __hash__(self):
+        return hash(
+            (type(self),) + tuple(getattr(self, name) for name in self.__slots__)
+        )
+
+
+class HDD(Part):
+    """A hard drive, SSD or SSHD from an "hdd" table."""
+
+    __slots__ = (
+        "part_num",
+        "brand",
+        "connector",
+        "hdd_capacity",
+        "ssd_capacity",
+        "speed",
+        "type",
+        "physical_size",
+        "height",
+        "interface",
+        "description",
+        "do_not_sub",
+        "subbed",
+    )
+
+    FIELDS = {
+        "hdd_capacity": parse_capacity,
+        "ssd_capacity": parse_capacity,
+        "speed": parse_rpm,
+        "height": parse_height,
+        "do_not_sub": parse_flag,
+        "subbed": parse_flag,
+    }
+
+    SPECS = {
+        "hdd_capacity": "hdd_bytes",
+        "ssd_capacity": "ssd_bytes",
+        "speed": "rpm",
+        "height": "height_mm",
+    }
+
+
+class MEM(Part):
+    """A memory module from a "mem" table."""
+
+    __slots__ = (
+        "part_num",
+        "speed",
+        "brand",
+        "connector",
+        "capacity",
+        "description",
+        "do_not_sub",
+        "subbed",
+    )
+
+    FIELDS = {
+        "speed": parse_transfer_rate,
+        "capacity": lambda text: parse_capacity(text, GIB),
+        "do_not_sub": parse_flag,
+        "subbed": parse_flag,
+    }
+
+    SPECS = {"capacity": "capacity_bytes", "speed": "mts"}
+
+
+class CPU(Part):
+    """A processor from a "cpu" table."""
+
+    __slots__ = (
+        "part_num",
+        "brand",
+        "description",
+        "oem_part_num",
+        "do_not_sub",
+        "subbed",
+    )
+
+    FIELDS = {"do_not_sub": parse_flag, "subbed": parse_flag}
+
+
+RECORD_CLASSES = {"hdd": HDD, "mem": MEM, "cpu": CPU}
+
+
+def record_class(table):
+    """
+    Returns the record class for table.
+
+    :param table: Name of database table
+    :raises ValueError: If table does not hold hdd, mem or cpu parts
+    :return: HDD, MEM or CPU
+    """
+    for prefix, cls in RECORD_CLASSES.items():
+        if table.lower().startswith(prefix):
+            return cls
+    raise ValueError("Unknown table: " + table)
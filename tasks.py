@@ -0,0 +1,136 @@
+"""Runs database work off the Tk thread and hands results back to it."""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Task:
+    """
+    A unit of work submitted to a TaskExecutor.
+
+    :param key: Tasks sharing a key supersede each other, None if the
+        task can not be superseded
+    """
+
+    def __init__(self, key=None):
+        self.key = key
+        self.future = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Cancels the task.  It will not start if it is still queued and
+        its callbacks will not be called if it is already running.
+        """
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class TaskExecutor:
+    """
+    Runs functions in a small thread pool so Tk callbacks never wait on
+    SQLite.  Results are put on a thread safe queue which is polled from
+    the Tk event loop with after(), so callbacks always run on the Tk
+    thread and may touch widgets freely.
+
+    Submitting a task with the same key as an earlier one cancels the
+    earlier one, e.g. only the latest filter change on a page is shown
+    however quickly the user clicks.
+
+    :param root: Tk widget whose event loop polls for results
+    :param workers: Number of worker threads
+    :param poll_ms: Milliseconds between polls of the result queue
+    """
+
+    def __init__(self, root, workers=2, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.results = queue.Queue()
+        self.latest = {}
+        self.root.after(self.poll_ms, self.poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, key=None, **kwargs):
+        """
+        Runs func(*args, **kwargs) on a worker thread.
+
+        :param func: Function to run, must not touch Tk
+        :param on_done: Called on the Tk thread with func's return value
+        :param on_error: Called on the Tk thread with the exception if
+            func raises, defaults to printing it
+        :param key: Cancel any unfinished task submitted with this key
+        :return: Task
+        """
+        task = Task(key)
+        if key is not None:
+            previous = self.latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self.latest[key] = task
+        task.future = self.pool.submit(
+            self._run, task, func, args, kwargs, on_done, on_error
+        )
+        return task
+
+    def reporter(self, callback):
+        """
+        Returns a thread safe callable for a task to report progress
+        with.  Each value it is called with is passed to callback on the
+        Tk thread.
+
+        :param callback: Called on the Tk thread with each value
+        :return: Callable taking one value
+        """
+        return lambda value: self.results.put((None, callback, value))
+
+    def cancel(self, key):
+        """
+        Cancels the unfinished task submitted with key, if any.
+
+        :param key: Key the task was submitted with
+        """
+        task = self.latest.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def _run(self, task, func, args, kwargs, on_done, on_error):
+        """Worker thread side of submit."""
+        if task.cancelled:
+            return
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.results.put((task, on_error or print, e))
+        else:
+            self.results.put((task, on_done, result))
+
+    def poll(self):
+        """
+        Schedules the next poll, then calls the callbacks of every
+        finished task on the Tk thread.
+        """
+        self.root.after(self.poll_ms, self.poll)
+        while True:
+            try:
+                task, callback, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                callback(value)
+                continue
+            if task.key is not None and self.latest.get(task.key) is task:
+                del self.latest[task.key]
+            if not task.cancelled and callback is not None:
+                callback(value)
+
+    def shutdown(self):
+        """Cancels every unfinished task and stops the worker threads."""
+        for task in list(self.latest.values()):
+            task.cancel()
+        self.latest.clear()
+        self.pool.shutdown(wait=False)
@@ -1,3 +1,13 @@
+import csv
+import io
+import os
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+
+from openpyxl import load_workbook
+
+from auto_hunt import dedupe, get_orders, non_warr_path, save_to_file, write_sheets
+from auto_hunt import main as auto_hunt_main
 from backend import *
 
 
@@ -19,6 +29,90 @@ def import_test():
         print(str(e))
         
 
+def import_blank_lines_test():
+    """Test blank lines in a csv are not imported as empty parts"""
+    file = os.path.join(tempfile.mkdtemp(), "blank_test.csv")
+    with open(file, "w", newline="") as csvfile:
+        csvfile.write("part_num,brand\r\n1,Dell\r\n\r\n2,HP\r\n\r\n")
+    try:
+        assert import_from_csv(file) == {"read": 2, "inserted": 2}
+        assert [part[0] for part in return_table("blank_test")] == ["1", "2"]
+        print("Import blank lines: Passed!\n")
+    except AssertionError as e:
+        print("Import blank lines: Failed!\n")
+        print(repr(e))
+    finally:
+        remove_table("blank_test")
+
+
+def sync_test():
+    """Test syncing a csv inserts, updates, skips and removes parts"""
+    file = os.path.join(tempfile.mkdtemp(), "cpu_sync.csv")
+
+    def write(lines, mtime_ns):
+        with open(file, "w", newline="") as csvfile:
+            csvfile.write("part_num,brand,description,oem_part_num,do_not_sub,subbed\r\n")
+            csvfile.write("".join(line + "\r\n" for line in lines))
+        os.utime(file, ns=(mtime_ns, mtime_ns))
+
+    write(["1,Acer,i5,SR1,FALSE,FALSE", "2,Acer,i7,SR2,FALSE,FALSE", "3,Acer,i3,SR3,FALSE,FALSE"], 10 ** 18)
+    try:
+        stats = sync_from_csv(file)
+        assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (3, 0, 0)
+        assert sync_from_csv(file)["skipped"] == True
+        write(["1,Acer,i5,SR1,FALSE,FALSE", "2,Dell,i7,SR2,FALSE,FALSE", "4,Acer,i9,SR4,FALSE,FALSE"], 2 * 10 ** 18)
+        stats = sync_from_csv(file)
+        assert stats["skipped"] == False
+        assert (stats["inserted"], stats["updated"], stats["unchanged"], stats["deleted"]) == (1, 1, 1, 0)
+        assert get_part("cpu_sync", "2")["brand"] == "Dell"
+        assert part_in_db("cpu_sync", "3") == True
+        update_part("cpu_sync", ["1","Acer","i5 edited","SR1","FALSE","FALSE"])
+        os.utime(file, ns=(3 * 10 ** 18, 3 * 10 ** 18))
+        stats = sync_from_csv(file, delete_missing=True)
+        assert (stats["inserted"], stats["updated"], stats["unchanged"], stats["deleted"]) == (0, 1, 2, 1)
+        assert get_part("cpu_sync", "1")["description"] == "i5"
+        assert part_in_db("cpu_sync", "3") == False
+        add_part("cpu_sync", ["5","Acer","i5","SR5","FALSE","FALSE"])
+        assert sync_from_csv(file)["skipped"] == True
+        stats = sync_from_csv(file, delete_missing=True)
+        assert (stats["skipped"], stats["unchanged"], stats["deleted"]) == (False, 3, 1)
+        assert part_in_db("cpu_sync", "5") == False
+        print("Sync: Passed!\n")
+    except AssertionError as e:
+        print("Sync: Failed!\n")
+        print(repr(e))
+    finally:
+        remove_table("cpu_sync")
+
+
+def import_many_test():
+    """Test importing several csv files at once"""
+    folder = tempfile.mkdtemp()
+    files = [os.path.join(folder, "many_a.csv"), os.path.join(folder, "many_b.csv")]
+    with open(files[0], "w", newline="") as csvfile:
+        csvfile.write("part_num,brand\r\n1,Acer\r\n2,Dell\r\n1,Acer\r\n")
+    with open(files[1], "w", newline="") as csvfile:
+        csvfile.write("part_num,brand\r\n3,Acer\r\n")
+    try:
+        stats = import_many(files, workers=2)
+        assert [stats[file]["read"] for file in files] == [3, 1]
+        assert [stats[file]["inserted"] for file in files] == [2, 1]
+        assert [stats[file]["ignored"] for file in files] == [1, 0]
+        assert [stats[file]["failed"] for file in files] == [0, 0]
+        assert part_in_db("many_a", "2") == True
+        assert part_in_db("many_b", "3") == True
+        summary = import_summary(stats).splitlines()
+        assert summary[0].startswith(files[0] + ": 3 read, 2 inserted, 1 duplicates ignored, 0 failed")
+        assert summary[-1] == "Total: 4 read, 3 inserted, 1 duplicates ignored, 0 failed"
+        print("Import many: Passed!\n")
+    except AssertionError as e:
+        print("Import many: Failed!\n")
+        print(repr(e))
+    finally:
+        remove_table("many_a")
+        remove_table("many_b")
+
+
 def add_part_test():
     """Test adding parts to database"""
     part_mem = ["111","PC4-19200S","Lenovo","SO-DIMM","8GB","8GB DDR4 2400 SoDIMM","FALSE","TRUE"]
@@ -34,6 +128,25 @@ def add_part_test():
         print(str(e))
 
 
+def add_parts_test():
+    """Test adding several parts to database at once"""
+    parts = [
+        ["211","PC4-19200S","Lenovo","SO-DIMM","8GB","8GB DDR4 2400 SoDIMM","FALSE","TRUE"],
+        ["212","PC4-19200S","Lenovo","SO-DIMM","8GB","8GB DDR4 2400 SoDIMM","FALSE","TRUE"],
+    ]
+    add_parts("mem_test", parts)
+    try:
+        assert part_in_db("mem_test", "211") == True
+        assert part_in_db("mem_test", "212") == True
+        assert remove_part("mem_test", "211") == "Done"
+        assert remove_part("mem_test", "211") is None
+        remove_part("mem_test", "212")
+        print("Add parts: Passed!\n")
+    except AssertionError as e:
+        print("Add parts: Failed!\n")
+        print(str(e))
+
+
 def remove_part_test():
     """Test removed parts from database"""
     remove_part("mem_test", "111")
@@ -72,6 +185,33 @@ def list_subs_test():
         print(repr(e))
 
         
+def list_subs_relaxed_test():
+    """Test listing larger and faster parts as relaxed subs"""
+    add_part("mem_test", ["901","2400","Lenovo","SO-DIMM","16GB","16GB 2400 SoDIMM","FALSE","TRUE"])
+    add_part("mem_test", ["902","2400","Lenovo","SO-DIMM","16GB","16GB 2400 SoDIMM","FALSE","TRUE"])
+    other = sqlite3.connect(settings.db_path)
+    other.execute("INSERT INTO mem_test VALUES ('903','PC4-19200S','Lenovo','SO-DIMM','32GB','','FALSE','TRUE')")
+    other.commit()
+    try:
+        assert [sub[1] for sub in list_subs("mem_test", "123")] == ["123"]
+        assert sorted(sub[1] for sub in list_subs("mem_test", "123", relaxed=True)) == ["123", "456", "903"]
+        assert sorted(sub[1] for sub in list_subs("mem_test", "456", relaxed=True)) == ["456", "903"]
+        assert sorted(sub[1] for sub in list_subs("mem_test", "901", relaxed=True)) == ["901", "902"]
+        subs = [sub[1] for sub in list_subs("hdd_test", "1111111", relaxed=True)]
+        assert "1111112" in subs and "9999999" in subs and "2222222" not in subs
+        assert "1111111" not in [sub[1] for sub in list_subs("hdd_test", "9999999", relaxed=True)]
+        print("List subs relaxed: Passed!\n")
+    except AssertionError as e:
+        print("List subs relaxed: Failed!\n")
+        print(repr(e))
+    finally:
+        other.execute("DELETE FROM mem_test WHERE part_num = '903'")
+        other.commit()
+        other.close()
+        remove_part("mem_test", "901")
+        remove_part("mem_test", "902")
+
+
 def valid_sub_test():
     """Test checking if subs are valid"""
     part_needing_sub = ["111","Acer","SATA","500","1000","5400","SSHD","2.5","7","SATA III","","FALSE","TRUE"]
@@ -97,6 +237,19 @@ def valid_sub_test():
         print(repr(e))        
         
 
+def list_subs_many_test():
+    """Test listing subs for several parts at once"""
+    subs = list_subs_many("hdd_test", ["111", "113", "999"])
+    try:
+        assert subs["111"] == list_subs("hdd_test", "111")
+        assert subs["113"] == list_subs("hdd_test", "113")
+        assert subs["999"] == []
+        print("List subs many: Passed!\n")
+    except AssertionError as e:
+        print("List subs many: Failed!\n")
+        print(repr(e))
+
+
 def edit_part_test():
     """Test checking if parts are updated correctly"""
     part_num = ["TEST", "999", "999", "999", "999", "999", "999", "999", "999", "999", "999", "TRUE", "TRUE"]
@@ -113,6 +266,219 @@ def edit_part_test():
         print(repr(e))
     
     
+def get_part_test():
+    """Test fetching a single part record"""
+    part = get_part("hdd_test", "TEST")
+    try:
+        assert part["part_num"] == "TEST"
+        assert part[0] == "TEST"
+        assert part["subbed"] == "FALSE"
+        assert get_part("hdd_test", "NOT A PART") is None
+        print("Get part: Passed!\n")
+    except AssertionError as e:
+        print("Get part: Failed!\n")
+        print(repr(e))
+
+
+def get_records_test():
+    """Test fetching parts as typed records"""
+    add_part("mem_test", ["311","PC4-19200S","Lenovo","SO-DIMM","8GB","8GB DDR4 2400 SoDIMM","FALSE","TRUE"])
+    record = get_records("mem_test", ["311"])[0]
+    try:
+        assert record.part_num == "311"
+        assert record.speed == 2400
+        assert record.capacity == 8 * 2 ** 30
+        assert record.do_not_sub == False
+        assert record.subbed == True
+        assert record in {get_records("mem_test", ["311"])[0]}
+        flags = get_records("mem_test", ["311"], ("part_num", "subbed"))[0]
+        assert flags.subbed == True and flags.capacity is None
+        try:
+            get_records("no_such_table")
+            assert False
+        except ValueError:
+            pass
+        print("Get records: Passed!\n")
+    except AssertionError as e:
+        print("Get records: Failed!\n")
+        print(repr(e))
+
+
+def filter_columns_test():
+    """Test filtering tables by several values and ranges"""
+    add_part("mem_test", ["411","PC4-19200S","Lenovo","SO-DIMM","8GB","O'Neil's 8GB","FALSE","TRUE"])
+    add_part("mem_test", ["412","PC4-19200S","Lenovo","SO-DIMM","4GB","4GB DDR4","FALSE","TRUE"])
+    try:
+        parts = filter_columns("mem_test", {"description": "O'Neil's 8GB"})
+        assert [part[0] for part in parts] == ["411"]
+        parts = filter_columns("mem_test", {"part_num": ["411", "412"], "capacity": ("4GB",)})
+        assert [part[0] for part in parts] == ["412"]
+        parts = filter_columns("mem_test", {"part_num": Between("411", "412")})
+        assert sorted(part[0] for part in parts) == ["411", "412"]
+        assert filter_columns("mem_test", {"part_num": []}) == []
+        counts = facet_counts("mem_test", {"description": "4GB DDR4"})
+        assert counts["part_num"] == [("412", 1)]
+        assert counts["capacity"] == [("4GB", 1)]
+        assert ("O'Neil's 8GB", 1) in counts["description"]
+        try:
+            filter_columns("mem_test", {"part_num = '1' OR 1": "1"})
+            assert False
+        except ValueError:
+            pass
+        print("Filter columns: Passed!\n")
+    except AssertionError as e:
+        print("Filter columns: Failed!\n")
+        print(repr(e))
+
+
+def facet_counts_test():
+    """Test counting the values each filter would still return"""
+    add_parts("mem_facet", [
+        ["1","PC4-19200S","Lenovo","SO-DIMM","8GB","8GB DDR4","FALSE","TRUE"],
+        ["2","PC4-19200S","Dell","SO-DIMM","16GB","16GB DDR4","FALSE","TRUE"],
+        ["3","PC3L-12800U","Lenovo","UDIMM","4GB","4GB DDR3L","FALSE","TRUE"],
+        ["4","PC4-19200S","Lenovo","SO-DIMM","","DDR4","FALSE","FALSE"],
+    ])
+    try:
+        counts = facet_counts("mem_facet", {})
+        assert counts["brand"] == [("Dell", 1), ("Lenovo", 3)]
+        assert counts["capacity"] == [("16GB", 1), ("4GB", 1), ("8GB", 1)]
+        counts = facet_counts("mem_facet", {"brand": "Lenovo"})
+        assert counts["brand"] == [("Dell", 1), ("Lenovo", 3)]
+        assert counts["connector"] == [("SO-DIMM", 2), ("UDIMM", 1)]
+        assert counts["subbed"] == [("FALSE", 1), ("TRUE", 2)]
+        counts = facet_counts("mem_facet", {"brand": "Lenovo", "connector": "SO-DIMM"})
+        assert counts["brand"] == [("Dell", 1), ("Lenovo", 2)]
+        assert counts["connector"] == [("SO-DIMM", 2), ("UDIMM", 1)]
+        assert counts["speed"] == [("PC4-19200S", 2)]
+        assert counts["capacity"] == [("8GB", 1)]
+        counts = facet_counts("mem_facet", {"brand": ["Dell", "Lenovo"], "capacity": "16GB"})
+        assert counts["part_num"] == [("2", 1)]
+        assert counts["brand"] == [("Dell", 1)]
+        counts = facet_counts("mem_facet", {"speed": Between("PC4", "PC5")})
+        assert counts["part_num"] == [("1", 1), ("2", 1), ("4", 1)]
+        counts = facet_counts("mem_facet", {}, "ddr3l")
+        assert counts["brand"] == [("Lenovo", 1)]
+        assert counts["part_num"] == [("3", 1)]
+        counts = facet_counts("mem_facet", {"brand": "Dell"}, "ddr4")
+        assert counts["brand"] == [("Dell", 1), ("Lenovo", 2)]
+        assert counts["capacity"] == [("16GB", 1)]
+        print("Facet counts: Passed!\n")
+    except AssertionError as e:
+        print("Facet counts: Failed!\n")
+        print(repr(e))
+    finally:
+        remove_table("mem_facet")
+
+
+def possible_values_test():
+    """Test listing the possible values of every column"""
+    add_part("cpu_test", ["511","Intel","i5","SR1","FALSE","FALSE"])
+    try:
+        values = return_all_possible_values("cpu_test")
+        assert "511" in values["part_num"]
+        assert "" not in values["oem_part_num"]
+        assert values["brand"] == return_possible_values("cpu_test", "brand")
+        add_part("cpu_test", ["512","AMD","Ryzen","","FALSE","FALSE"])
+        assert "AMD" in return_possible_values("cpu_test", "brand")
+        print("Possible values: Passed!\n")
+    except AssertionError as e:
+        print("Possible values: Failed!\n")
+        print(repr(e))
+
+
+def get_page_test():
+    """Test paging through a table by part number"""
+    parts = [["6" + str(i).zfill(2),"Intel","","SR6","FALSE","FALSE"] for i in range(25)]
+    add_parts("cpu_test", parts)
+    try:
+        assert count_rows("cpu_test", {"oem_part_num": "SR6"}) == 25
+        page = get_page("cpu_test", {"oem_part_num": "SR6"}, limit=10)
+        assert [part[0] for part in page] == [part[0] for part in parts[:10]]
+        page = get_page("cpu_test", {"oem_part_num": "SR6"}, after="609", limit=10)
+        assert page[0][0] == "610"
+        page = get_page("cpu_test", {"oem_part_num": "SR6"}, before="610", limit=3)
+        assert [part[0] for part in page] == ["607", "608", "609"]
+        assert len(list(iter_pages("cpu_test", {"oem_part_num": "SR6"}, limit=10))) == 25
+        print("Get page: Passed!\n")
+    except AssertionError as e:
+        print("Get page: Failed!\n")
+        print(repr(e))
+
+
+def search_parts_test():
+    """Test finding parts by the start of their part number"""
+    add_part("cpu_test", ["AB701","Intel","i7","SRX01","FALSE","FALSE"])
+    add_part("cpu_test", ["AB702","Intel","i7","SRX02","FALSE","FALSE"])
+    try:
+        matches = search_parts("ab70", tables=("cpu_test",))
+        assert [match[1] for match in matches] == ["AB701", "AB702"]
+        matches = search_parts("srx02", tables=("cpu_test", "missing_table"))
+        assert matches == [("cpu_test", "AB702", "SRX02")]
+        assert len(search_parts("AB", limit=1, tables=("cpu_test",))) == 1
+        assert search_parts("", tables=("cpu_test",)) == []
+        print("Search parts: Passed!\n")
+    except AssertionError as e:
+        print("Search parts: Failed!\n")
+        print(repr(e))
+
+
+def full_text_search_test():
+    """Test searching descriptions with the full text index"""
+    add_part("cpu_test", ["711","Intel","CPU AW8063801152800 INTEL I7-3632QM 2.2G/6M SR0V0","SR0V0","FALSE","FALSE"])
+    add_part("cpu_test", ["712","Intel","CPU INTEL I5-3320M 2.6G/3M SR0MX","SR0MX","FALSE","FALSE"])
+    try:
+        assert [part[0] for part in full_text_search("cpu_test", "i7-3632qm")] == ["711"]
+        assert [part[0] for part in full_text_search("cpu_test", "sr0m")] == ["712"]
+        parts = full_text_search("cpu_test", "intel 2.6g", {"brand": "Intel"})
+        assert [part[0] for part in parts] == ["712"]
+        update_part("cpu_test", ["712","Intel","CPU INTEL I5-3340M","SR0MX","FALSE","FALSE"])
+        assert full_text_search("cpu_test", "3320M") == []
+        assert [part[0] for part in full_text_search("cpu_test", "3340M")] == ["712"]
+        remove_part("cpu_test", "712")
+        assert full_text_search("cpu_test", "3340M") == []
+        print("Full text search: Passed!\n")
+    except AssertionError as e:
+        print("Full text search: Failed!\n")
+        print(repr(e))
+
+
+def get_parts_test():
+    """Test fetching many parts and failing on missing tables"""
+    try:
+        parts = get_parts("hdd_test", ["1111111", "NOT A PART"], ("subbed",))
+        assert list(parts) == ["1111111"]
+        try:
+            get_parts("no_such_table", ["1111111"])
+            assert False
+        except sqlite3.OperationalError:
+            pass
+        print("Get parts: Passed!\n")
+    except AssertionError as e:
+        print("Get parts: Failed!\n")
+        print(repr(e))
+
+
+def migrate_test():
+    """Test migrating a database with a table that is not a parts table"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE cpu_notes(part_num PRIMARY KEY, note)")
+    conn.execute("CREATE TABLE cpu_parts(part_num PRIMARY KEY, brand, description, oem_part_num, do_not_sub, subbed)")
+    try:
+        version = migrate(conn)
+        assert version > 0
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master")]
+        assert "sub_groups_cpu_parts" in names
+        assert "sub_groups_cpu_notes" not in names
+        print("Migrate: Passed!\n")
+    except AssertionError as e:
+        print("Migrate: Failed!\n")
+        print(repr(e))
+    finally:
+        conn.close()
+
+
 def remove_table_test():
     """Test checking if tables are removed correctly"""
     try:
@@ -125,10 +491,167 @@ def remove_table_test():
         print(repr(e))
      
                 
-import_test()
-add_part_test()
-remove_part_test()    
-list_subs_test()
-valid_sub_test()
-edit_part_test()
-remove_table_test()
+def report_file(rows):
+    """Writes rows of (location, SO, warranty, brand, part number) to a
+    temporary openPO report and returns its path"""
+    file = os.path.join(tempfile.mkdtemp(), "report.txt")
+    with open(file, "w", newline="") as report:
+        report.write("\t".join("h" + str(i) for i in range(40)) + "\r\n")
+        for loc, so, warr, brand, part_num in rows:
+            row = [""] * 40
+            row[0], row[13], row[14], row[15] = loc, so, warr, warr
+            row[21], row[31] = brand, part_num
+            report.write("\t".join(row) + "\r\n")
+    return file
+
+
+def get_orders_test():
+    """Test the report is filtered to valid orders without duplicates"""
+    all_parts = {"1": "HDD", "2": "MEM"}
+    file = report_file([
+        ("622", "SO1", "MFG Warranty", "DEL", "1"),
+        ("622", "SO1", "MFG Warranty", "DEL", "1"),
+        ("630", "SO2", "Customer Pay", "ACE", "1"),
+        ("68", "SO3", "MFG Warranty", "HEW", "2"),
+        ("999", "SO4", "MFG Warranty", "DEL", "2"),
+        ("622", "SO5", "MFG Warranty", "XXX", "2"),
+        ("622", "SO6", "MFG Warranty", "DEL", "3"),
+    ])
+    with open(file, "a", newline="") as report:
+        report.write("622\tshort row\r\n")
+    archive = os.path.join(tempfile.mkdtemp(), "copy", "report.txt")
+    try:
+        assert list(dedupe([["1", "HDD"], ["2", "MEM"], ["1", "HDD"]])) == [["1", "HDD"], ["2", "MEM"]]
+        assert list(get_orders(file, all_parts, archive)) == [
+            ["1", "HDD", "MFG Warranty", "SO1"],
+            ["1", "HDD", "Customer Pay", "SO2"],
+            ["2", "MEM", "MFG Warranty", "SO3"],
+        ]
+        with open(file, "rb") as report, open(archive, "rb") as copy:
+            assert report.read() == copy.read()
+        print("Get orders: Passed!\n")
+    except AssertionError as e:
+        print("Get orders: Failed!\n")
+        print(repr(e))
+
+
+def write_sheets_test():
+    """Test the Needs Sub and Non-Warr Orders rows built from the orders"""
+    orders = [
+        ["1", "HDD", "MFG Warranty", "SO1"],
+        ["1", "HDD", "Customer Pay", "SO2"],
+        ["2", "MEM", "MFG Warranty", "SO3"],
+    ]
+    needs_sub = []
+    non_warr = []
+    try:
+        write_sheets(iter(orders), needs_sub.append, non_warr.append)
+        assert needs_sub == [["Part Num", "Type"], ["1", "HDD"], ["2", "MEM"]]
+        assert non_warr == [["Part Num", "Type", "Warr", "SO"], ["1", "HDD", "Customer Pay", "SO2"]]
+        non_warr = []
+        write_sheets(orders[2:], [].append, non_warr.append)
+        assert non_warr == []
+        print("Write sheets: Passed!\n")
+    except AssertionError as e:
+        print("Write sheets: Failed!\n")
+        print(repr(e))
+
+
+def save_to_file_test():
+    """Test the results are saved as a workbook or as two CSV files"""
+    orders = [["1", "HDD", "MFG Warranty", "SO1"], ["2", "MEM", "Customer Pay", "SO2"]]
+    folder = tempfile.mkdtemp()
+    workbook = os.path.join(folder, "hunt.xlsx")
+    path = os.path.join(folder, "hunt.csv")
+    try:
+        assert save_to_file(iter(orders), workbook) == "Done"
+        sheets = load_workbook(workbook)
+        assert sheets.sheetnames == ["Needs Sub", "Non-Warr Orders"]
+        assert [list(row) for row in sheets["Needs Sub"].values] == [["Part Num", "Type"], ["1", "HDD"], ["2", "MEM"]]
+        assert save_to_file(iter(orders), path) == "Done"
+        assert non_warr_path(path) == os.path.join(folder, "hunt Non-Warr Orders.csv")
+        with open(path, newline="") as csvfile:
+            assert list(csv.reader(csvfile)) == [["Part Num", "Type"], ["1", "HDD"], ["2", "MEM"]]
+        with open(non_warr_path(path), newline="") as csvfile:
+            assert list(csv.reader(csvfile)) == [["Part Num", "Type", "Warr", "SO"], ["2", "MEM", "Customer Pay", "SO2"]]
+        print("Save to file: Passed!\n")
+    except AssertionError as e:
+        print("Save to file: Failed!\n")
+        print(repr(e))
+
+
+def auto_hunt_main_test():
+    """Test Auto Hunt exits with 0 after a hunt and 1 without a database"""
+    db_path = settings.db_path
+    folder = tempfile.mkdtemp()
+    parts_dir = os.path.join(folder, "parts")
+    os.mkdir(parts_dir)
+    for part_type, part_num in (("HDD", "1"), ("MEM", "2"), ("CPU", "3")):
+        with open(os.path.join(parts_dir, "all" + part_type + ".csv"), "w") as csvfile:
+            csvfile.write(part_num + "\n")
+    tables = {
+        "hdd": "part_num,brand,connector,hdd_capacity,ssd_capacity,speed,type,physical_size,height,interface,description,do_not_sub,subbed\r\n"
+        "1,Dell,SATA,500,,5400,HDD,2.5,7,SATA III,,FALSE,TRUE\r\n",
+        "mem": "part_num,speed,brand,connector,capacity,description,do_not_sub,subbed\r\n",
+        "cpu": "part_num,brand,description,oem_part_num,do_not_sub,subbed\r\n",
+    }
+    report = report_file([
+        ("622", "SO1", "MFG Warranty", "DEL", "1"),
+        ("622", "SO2", "MFG Warranty", "DEL", "2"),
+    ])
+    output = os.path.join(folder, "hunt.csv")
+    missing = os.path.join(folder, "missing.db")
+    empty = os.path.join(folder, "empty.db")
+    open(empty, "w").close()
+    try:
+        configure(db_path=os.path.join(folder, "parts.db"))
+        for table, lines in tables.items():
+            file = os.path.join(folder, table + ".csv")
+            with open(file, "w", newline="") as csvfile:
+                csvfile.write(lines)
+            import_from_csv(file)
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            assert auto_hunt_main([report, "-o", output, "-p", parts_dir, "-d", os.path.join(folder, "parts.db")]) == 0
+            assert auto_hunt_main([report, "-p", parts_dir, "-d", missing]) == 1
+            assert auto_hunt_main([report, "-p", parts_dir, "-d", empty]) == 1
+        with open(output, newline="") as csvfile:
+            assert list(csv.reader(csvfile)) == [["Part Num", "Type"], ["2", "MEM"]]
+        assert os.path.exists(missing) == False
+        print("Auto Hunt main: Passed!\n")
+    except AssertionError as e:
+        print("Auto Hunt main: Failed!\n")
+        print(repr(e))
+    finally:
+        configure(db_path=db_path)
+
+
+# import_many starts worker processes, which import this module again
+# on Windows.
+if __name__ == "__main__":
+    import_test()
+    import_blank_lines_test()
+    sync_test()
+    import_many_test()
+    add_part_test()
+    add_parts_test()
+    remove_part_test()
+    list_subs_test()
+    list_subs_relaxed_test()
+    valid_sub_test()
+    list_subs_many_test()
+    edit_part_test()
+    get_part_test()
+    get_records_test()
+    filter_columns_test()
+    facet_counts_test()
+    possible_values_test()
+    get_page_test()
+    search_parts_test()
+    full_text_search_test()
+    get_parts_test()
+    migrate_test()
+    remove_table_test()
+    get_orders_test()
+    write_sheets_test()
+    save_to_file_test()
+    auto_hunt_main_test()